@@ -0,0 +1,137 @@
+# 🗄️ Cold archive for resolved chats
+#
+# Resolved chats older than a cutoff move from the hot `chats` table into
+# `chats_archive`, with their JSON transcript zlib-compressed. Each batch is
+# one transaction (copy, then delete), so a crash never loses a chat and a
+# re-run simply skips what was already copied. Reads fall back to the
+# archive transparently via load_messages().
+import json
+import zlib
+
+COMPRESSION_LEVEL = 6
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats_archive (
+    id            VARCHAR(36) PRIMARY KEY,
+    customer_id   VARCHAR(255),
+    customer_name VARCHAR(255),
+    customer_email VARCHAR(255),
+    case_number   VARCHAR(64),
+    agent_id      VARCHAR(255),
+    issue         TEXT,
+    created_at    DATETIME,
+    resolved_at   DATETIME,
+    messages_z    LONGBLOB,
+    raw_bytes     INT UNSIGNED NOT NULL,
+    stored_bytes  INT UNSIGNED NOT NULL,
+    archived_at   DATETIME NOT NULL,
+    INDEX (customer_id),
+    INDEX (resolved_at)
+)
+"""
+
+
+def compress_messages(messages_json):
+    raw = (messages_json or '[]').encode('utf-8')
+    return zlib.compress(raw, COMPRESSION_LEVEL), len(raw)
+
+
+def decompress_messages(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8')) if blob else []
+
+
+def ensure_archive_table(cur):
+    cur.execute(ARCHIVE_SCHEMA)
+
+
+def archive_batch(cur, conn, cutoff, batch_size, resolved_state, now):
+    """Move one batch of resolved chats older than cutoff; returns (chats, raw_bytes, stored_bytes)."""
+    cur.execute(
+        "SELECT id, customer_id, customer_name, customer_email, case_number, agent_id, issue, "
+        "created_at, resolved_at, messages FROM chats "
+        "WHERE state = %s AND resolved_at < %s ORDER BY resolved_at LIMIT %s",
+        (resolved_state, cutoff, batch_size)
+    )
+    chats = cur.fetchall()
+    if not chats:
+        return 0, 0, 0
+    rows, raw_total, stored_total = [], 0, 0
+    for chat in chats:
+        blob, raw_bytes = compress_messages(chat['messages'])
+        raw_total += raw_bytes
+        stored_total += len(blob)
+        rows.append((chat['id'], chat['customer_id'], chat['customer_name'], chat['customer_email'],
+                     chat['case_number'], chat['agent_id'], chat['issue'], chat['created_at'],
+                     chat['resolved_at'], blob, raw_bytes, len(blob), now))
+    try:
+        cur.executemany(
+            "INSERT IGNORE INTO chats_archive (id, customer_id, customer_name, customer_email, case_number, "
+            "agent_id, issue, created_at, resolved_at, messages_z, raw_bytes, stored_bytes, archived_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            rows
+        )
+        ids = [chat['id'] for chat in chats]
+        cur.execute(
+            f"DELETE FROM chats WHERE id IN ({', '.join(['%s'] * len(ids))})",
+            ids
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(chats), raw_total, stored_total
+
+
+def load_messages(cur, chat_id):
+    """Messages for a chat from the hot table, falling back to the archive; None if unknown."""
+    cur.execute("SELECT messages FROM chats WHERE id = %s", (chat_id,))
+    chat = cur.fetchone()
+    if chat:
+        return json.loads(chat['messages']) if chat['messages'] else []
+    cur.execute("SELECT messages_z FROM chats_archive WHERE id = %s", (chat_id,))
+    archived = cur.fetchone()
+    if archived:
+        return decompress_messages(archived['messages_z'])
+    return None
+
+
+def iter_archived_chats(cur, batch_size=500):
+    """Archived chats, most recently resolved first, in keyset-paged batches with messages decompressed."""
+    last = None
+    while True:
+        if last is None:
+            cur.execute(
+                "SELECT id, customer_id, customer_name, case_number, created_at, resolved_at, messages_z "
+                "FROM chats_archive ORDER BY resolved_at DESC, id DESC LIMIT %s",
+                (batch_size,)
+            )
+        else:
+            cur.execute(
+                "SELECT id, customer_id, customer_name, case_number, created_at, resolved_at, messages_z "
+                "FROM chats_archive WHERE (resolved_at, id) < (%s, %s) "
+                "ORDER BY resolved_at DESC, id DESC LIMIT %s",
+                (last['resolved_at'], last['id'], batch_size)
+            )
+        rows = cur.fetchall()
+        if not rows:
+            return
+        for row in rows:
+            row['messages'] = decompress_messages(row.pop('messages_z'))
+        yield rows
+        last = rows[-1]
+
+
+def archive_report(cur):
+    cur.execute(
+        "SELECT COUNT(*) AS chats, COALESCE(SUM(raw_bytes), 0) AS raw_bytes, "
+        "COALESCE(SUM(stored_bytes), 0) AS stored_bytes FROM chats_archive"
+    )
+    row = cur.fetchone()
+    raw, stored = int(row['raw_bytes']), int(row['stored_bytes'])
+    return {
+        'archived_chats': int(row['chats']),
+        'raw_bytes': raw,
+        'stored_bytes': stored,
+        'bytes_saved': raw - stored,
+        'compression_ratio': round(raw / stored, 2) if stored else None
+    }
@@ -0,0 +1,76 @@
+"""
+Queue-wait simulation for capacity-based routing.
+
+Discrete-event simulation that drives routing.AgentPool exactly the way
+server.py does (route on escalation, backfill on resolve). Text chats are
+mostly idle time, so a chat handled alongside others only takes a little
+longer: its handle time is stretched by (1 + slowdown * (load - 1)).
+
+    python benchmarks/agent_capacity_sim.py [agents] [chats_per_hour]
+"""
+import heapq
+import os
+import random
+import statistics
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routing import AgentPool  # noqa: E402
+
+
+def simulate(agents, capacity, chats_per_hour, mean_handle_min=12.0, slowdown=0.15,
+             hours=8, seed=7):
+    rng = random.Random(seed)
+    pool = AgentPool(default_capacity=capacity)
+    for i in range(agents):
+        pool.set_available(f'agent{i}')
+
+    events = []  # (time_min, kind, chat_id)
+    t, chat_id = 0.0, 0
+    while t < hours * 60:
+        t += rng.expovariate(chats_per_hour / 60)
+        heapq.heappush(events, (t, 'arrive', chat_id))
+        chat_id += 1
+
+    queue = deque()   # (chat_id, arrived_at)
+    waits = []
+
+    def route(now):
+        while queue:
+            slot = pool.pick_agent()
+            if slot is None:
+                return
+            cid, arrived = queue.popleft()
+            waits.append(now - arrived)
+            pool.assign(slot.agent_id, cid)
+            handle = rng.expovariate(1 / mean_handle_min) * (1 + slowdown * (slot.load - 1))
+            heapq.heappush(events, (now + handle, 'resolve', cid))
+
+    while events:
+        now, kind, cid = heapq.heappop(events)
+        if kind == 'arrive':
+            queue.append((cid, now))
+        else:
+            pool.release(cid)
+        route(now)
+
+    waits.sort()
+    return {
+        'chats': len(waits),
+        'mean_wait_min': statistics.fmean(waits),
+        'p95_wait_min': waits[int(len(waits) * 0.95) - 1],
+        'max_wait_min': waits[-1],
+    }
+
+
+if __name__ == '__main__':
+    agents = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    print(f"{agents} agents, {rate:g} chats/hour, 12 min mean handle time")
+    print(f"{'capacity':>8} {'chats':>6} {'mean wait':>10} {'p95 wait':>10} {'max wait':>10}")
+    for capacity in (1, 2, 3, 4):
+        r = simulate(agents, capacity, rate)
+        print(f"{capacity:>8} {r['chats']:>6} {r['mean_wait_min']:>9.1f}m "
+              f"{r['p95_wait_min']:>9.1f}m {r['max_wait_min']:>9.1f}m")
@@ -0,0 +1,66 @@
+"""
+Startup benchmark: how long a fresh interpreter takes to `import server`
+(importing starts nothing; the app is built by an entry point), and what
+the lazy warm-up steps cost when they do run.
+
+    python benchmarks/import_time.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import(runs):
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    samples = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import server'], cwd=ROOT, env=env, check=True)
+        samples.append((time.perf_counter() - began) * 1000)
+    return samples
+
+
+def slowest_imports(limit=10):
+    """Top cumulative entries from `python -X importtime -c 'import server'`."""
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import server'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # "import time:  self_us | cumulative_us | module"
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def time_warmup():
+    sys.path.insert(0, ROOT)
+    import catalog
+    import server
+    steps = {}
+    for name, step in [('catalog', catalog.get_catalog),
+                       ('refund_table', lambda: catalog.get_catalog().refund_table),
+                       ('llm_client', server.get_llm_client)]:
+        began = time.perf_counter()
+        step()
+        steps[name] = (time.perf_counter() - began) * 1000
+    return steps
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    samples = time_import(runs)
+    print(f"import server: median {statistics.median(samples):.1f} ms, "
+          f"min {min(samples):.1f} ms over {runs} runs")
+    print("slowest imports (cumulative):")
+    for cumulative_us, name in slowest_imports():
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    print("lazy warm-up steps:")
+    for name, ms in time_warmup().items():
+        print(f"  {name:<13} {ms:8.1f} ms")
@@ -0,0 +1,63 @@
+"""
+Query latency for suggested replies over a synthetic resolved-chat history.
+
+    python benchmarks/suggestions_latency.py [chats] [queries]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suggestions import SuggestionIndex  # noqa: E402
+
+TOPICS = {
+    'refund': ['refund', 'money', 'back', 'return', 'days', 'window', 'eligible', 'policy'],
+    'delivery': ['order', 'delivery', 'late', 'package', 'shipped', 'tracking', 'arrive', 'courier'],
+    'payment': ['payment', 'failed', 'card', 'declined', 'charged', 'twice', 'paystack', 'bank'],
+    'account': ['account', 'password', 'login', 'email', 'reset', 'locked', 'phone', 'verify'],
+    'product': ['macbook', 'wig', 'size', 'colour', 'broken', 'damaged', 'screen', 'warranty'],
+}
+FILLER = [f'word{i}' for i in range(20000)]
+
+
+def fake_chat(rng):
+    topic = rng.choice(list(TOPICS))
+    messages = []
+    for turn in range(rng.randint(1, 4)):
+        words = rng.choices(TOPICS[topic], k=rng.randint(3, 8)) + rng.choices(FILLER, k=rng.randint(2, 10))
+        messages.append({'from': 'customer', 'text': ' '.join(words)})
+        messages.append({'from': 'agent', 'text': f'Template answer about {topic} #{rng.randint(0, 300)}'})
+    return messages
+
+
+if __name__ == '__main__':
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rng = random.Random(1)
+    index = SuggestionIndex()
+
+    began = time.perf_counter()
+    for _ in range(chats):
+        index.add_chat(fake_chat(rng))
+    build = time.perf_counter() - began
+    print(f"indexed {chats} chats / {len(index)} replies in {build:.1f}s "
+          f"({build / chats * 1e6:.0f} us per chat)")
+
+    # First query per term materializes its posting arrays; measure steady state too
+    samples = []
+    for _ in range(queries):
+        text = fake_chat(rng)[0]['text']
+        t0 = time.perf_counter()
+        index.suggest(text, k=3)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    print(f"query: median {statistics.median(samples):.2f} ms, "
+          f"p95 {samples[int(len(samples) * 0.95) - 1]:.2f} ms, max {samples[-1]:.2f} ms")
+
+    t0 = time.perf_counter()
+    index.add_chat(fake_chat(rng))
+    index.suggest('refund money back please', k=3)
+    print(f"incremental add + first query after it: {(time.perf_counter() - t0) * 1000:.2f} ms")
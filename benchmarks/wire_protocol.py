@@ -0,0 +1,117 @@
+"""
+Bytes on the wire and serialize time per chat event: legacy JSON vs the
+compact MessagePack protocol (wire.py).
+
+Legacy payloads are built exactly as server.py builds them and encoded the
+way python-socketio does (json.dumps with compact separators). Timings
+include building the payload, since the compact form converts timestamps.
+Compact chat_assigned carries no transcript (clients fetch it with
+chat_history after=<seq>), so its row compares against the legacy event
+that embeds the whole history.
+
+    python benchmarks/wire_protocol.py [history_messages] [iterations]
+"""
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire  # noqa: E402
+
+PHRASES = [
+    "Hi, my order hasn't arrived yet and the tracking page hasn't changed in three days",
+    "I was charged twice for the same order, can you check the payment?",
+    "Thanks for waiting, I'm looking into this for you now",
+    "I can see the payment went through, the refund will be processed in 3-5 working days",
+    "Ok thank you",
+    "Is there anything else I can help you with today?",
+]
+
+
+def fake_chat(history, rng):
+    started = datetime(2026, 3, 1, 10, 0, 0)
+    messages = [{
+        'from': 'customer' if i % 2 == 0 else 'agent',
+        'text': rng.choice(PHRASES),
+        'timestamp': (started + timedelta(seconds=45 * i)).isoformat()
+    } for i in range(history)]
+    chat = {
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'case_number': 'CS-2026-004211',
+        'customer_name': 'Ada Obi',
+        'customer_email': 'ada@example.com',
+        'customer_id': 'user123',
+        'issue': 'Order not delivered',
+        'created_at': started,
+    }
+    details = {'name': 'Ada Obi', 'email': 'ada@example.com', 'phone': '+2348012345678', 'type': 'regular',
+               'memberSince': '2024-06-01', 'profile': None}
+    return chat, messages, details
+
+
+def legacy_events(chat, messages, details):
+    """Payloads in the shape server.py sends to legacy clients."""
+    last = messages[-1]
+    return {
+        'new_message': lambda: {
+            'chat_id': chat['id'], 'message': last['text'], 'sender': last['from'],
+            'id': f"msg_{len(messages) - 1}", 'content': last['text'], 'timestamp': last['timestamp']
+        },
+        'chat_assigned': lambda: {
+            'id': chat['id'], 'chat_id': chat['id'], 'caseNumber': chat['case_number'],
+            'customerName': chat['customer_name'], 'customerDetails': details, 'issue': chat['issue'],
+            'messages': [{'id': f"msg_{i}", 'content': m['text'],
+                          'sender': 'user' if m['from'] == 'customer' else m['from'],
+                          'timestamp': m['timestamp']} for i, m in enumerate(messages)],
+            'timestamp': chat['created_at'].isoformat(), 'priority': 'medium',
+            'agent_id': 'agent-sid', 'agent_name': 'Tolu'
+        },
+        'chat_history': lambda: {
+            'chat_id': chat['id'],
+            'messages': [{'id': f"msg_{i}", 'content': m['text'], 'sender': m['from'],
+                          'timestamp': m['timestamp']} for i, m in enumerate(messages)]
+        },
+        'chat_resolved': lambda: {'chat_id': chat['id'], 'message': 'This chat has been marked as resolved'},
+    }
+
+
+def compact_events(chat, messages, details):
+    seq = len(messages) - 1
+    return {
+        'new_message': lambda: wire.new_message(chat['id'], seq, messages[-1]),
+        'chat_assigned': lambda: wire.chat_assigned(chat, seq, details, 'agent-sid', 'Tolu'),
+        'chat_history': lambda: wire.history(chat['id'], messages),
+        'chat_resolved': lambda: wire.notice(chat['id'], 'This chat has been marked as resolved'),
+    }
+
+
+def measure(build, encode, iterations):
+    data = encode(build())
+    began = time.perf_counter()
+    for _ in range(iterations):
+        encode(build())
+    return len(data), (time.perf_counter() - began) / iterations * 1e6
+
+
+if __name__ == '__main__':
+    history = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    chat, messages, details = fake_chat(history, random.Random(1))
+    legacy = legacy_events(chat, messages, details)
+    compact = compact_events(chat, messages, details)
+
+    def to_json(payload):
+        return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+    print(f"{history}-message chat, {iterations} iterations per event")
+    print(f"{'event':<14} {'json B':>8} {'msgpack B':>10} {'saved':>6} {'json us':>9} {'msgpack us':>11}")
+    for event in wire.COMPACT_EVENTS:
+        json_bytes, json_us = measure(legacy[event], to_json, iterations)
+        mp_bytes, mp_us = measure(compact[event], wire.pack, iterations)
+        print(f"{event:<14} {json_bytes:>8} {mp_bytes:>10} {1 - mp_bytes / json_bytes:>6.0%} "
+              f"{json_us:>9.1f} {mp_us:>11.1f}")
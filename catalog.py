@@ -0,0 +1,111 @@
+# 📦 Customer/order/payment/product data and its lookup indexes
+#
+# Nothing is read from disk at import time: the first get_catalog() call
+# loads the mock JSON files and builds the indexes (the warm-up task does
+# this ahead of traffic), and every later call returns the same instance.
+import json
+import os
+import re
+import threading
+
+MOCK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock')
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+ORDER_ID_RE = re.compile(r'\b(ord\d+)\b', re.IGNORECASE)
+PAYMENT_ID_RE = re.compile(r'\b(pay\d+)\b', re.IGNORECASE)
+
+
+# 📦 Utility to load JSON files from /mock folder
+def load_data(filename):
+    with open(os.path.join(MOCK_DIR, filename), 'r') as f:
+        return json.load(f)
+
+
+class Catalog:
+    def __init__(self, customers, products, orders, payments, policy):
+        self.customers = customers
+        self.products = products
+        self.orders = orders
+        self.payments = payments
+        self.policy = policy
+
+        # 🗂️ Lookup indexes so request handlers never scan the full lists
+        self.customers_by_id = {c['user_id']: c for c in customers}
+        self.customers_by_contact = {}
+        for c in customers:
+            self.customers_by_contact.setdefault(c['email'], c)
+            self.customers_by_contact.setdefault(c['phone'], c)
+        self.products_by_id = {p['product_id']: p for p in products}
+        self.payments_by_id = {p['paymentid']: p for p in payments}
+        self.orders_by_id = {o['order_id']: o for o in orders}
+
+        # Per-user orders, oldest first (so [-1] is the most recent one)
+        self.orders_by_user = {}
+        for o in orders:
+            self.orders_by_user.setdefault(o['userid'], []).append(o)
+        for user_orders in self.orders_by_user.values():
+            user_orders.sort(key=self.order_recency_key)
+
+        self._refund_table = None
+
+    @classmethod
+    def load(cls):
+        return cls(
+            customers=load_data('customers.json'),
+            products=load_data('products.json'),
+            orders=load_data('orders.json'),
+            payments=load_data('payments.json'),
+            policy=load_data('support_policy.json'),
+        )
+
+    def order_recency_key(self, order):
+        """Sort key for an order: payment time, falling back to delivery date."""
+        payment = self.payments_by_id.get(order.get('paymentid'))
+        if payment and payment.get('timestamp'):
+            return payment['timestamp']
+        return order.get('delivered_on') or ''
+
+    def resolve_order(self, message, user_id):
+        """
+        Pick the order a message is about.
+        Explicit order/payment IDs in the message win (if they belong to the
+        customer); otherwise the customer's most recent order is used.
+        Returns (order, explicit) or (None, False) if the customer has no orders.
+        """
+        for order_id in ORDER_ID_RE.findall(message):
+            order = self.orders_by_id.get(order_id.lower())
+            if order and order['userid'] == user_id:
+                return order, True
+        for payment_id in PAYMENT_ID_RE.findall(message):
+            payment = self.payments_by_id.get(payment_id.lower())
+            if payment and payment['userid'] == user_id:
+                order = self.orders_by_id.get(payment['order_id'])
+                if order:
+                    return order, True
+        user_orders = self.orders_by_user.get(user_id)
+        if not user_orders:
+            return None, False
+        return user_orders[-1], False
+
+    def refund_window(self, order):
+        from refunds import refund_window_for
+        return refund_window_for(order, self.payments_by_id.get(order.get('paymentid')), self.policy)
+
+    @property
+    def refund_table(self):
+        """Pre-parsed delivery dates/windows for bulk refund evaluation (NumPy, built on first use)."""
+        if self._refund_table is None:
+            from refunds import RefundTable
+            self._refund_table = RefundTable(self.orders, self.payments_by_id, self.policy)
+        return self._refund_table
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = Catalog.load()
+    return _catalog
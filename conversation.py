@@ -0,0 +1,128 @@
+# 💬 Session-scoped conversation memory for /support
+#
+# Each session keeps its most recent turns verbatim within a token budget;
+# older turns are folded into a short running summary instead of being
+# resent to the LLM. Sessions live in an LRU: idle ones expire, and the
+# least recently used are dropped when the session or memory cap is hit.
+import time
+from collections import OrderedDict, deque
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+class Session:
+    __slots__ = ('turns', 'summary', 'tokens', 'size', 'last_seen', 'order_id', 'intents')
+
+    def __init__(self):
+        self.turns = deque()      # (role, text) pairs, oldest first
+        self.summary = ''
+        self.tokens = 0           # tokens in turns + summary
+        self.size = 0             # characters held, for the memory cap
+        self.last_seen = time.monotonic()
+        self.order_id = None      # order the conversation is about, if known
+        self.intents = {}         # fast-path intent -> times answered
+
+    def customer_turns(self):
+        return sum(1 for role, _ in self.turns if role == 'customer')
+
+
+class ConversationMemory:
+    def __init__(self, token_budget=800, summary_tokens=200, idle_ttl=1800,
+                 max_sessions=10000, max_chars=32 * 1024 * 1024, clock=time.monotonic):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self.clock = clock
+        self.sessions = OrderedDict()
+        self.total_chars = 0
+        self.evicted = 0
+
+    def get(self, session_id, create=True):
+        """Return the session (marking it recently used), or None if absent and create is False."""
+        self._expire_idle()
+        session = self.sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = self.sessions[session_id] = Session()
+        else:
+            self.sessions.move_to_end(session_id)
+        session.last_seen = self.clock()
+        return session
+
+    def add_turn(self, session_id, role, text):
+        session = self.get(session_id)
+        session.turns.append((role, text))
+        session.tokens += estimate_tokens(text)
+        session.size += len(text)
+        self.total_chars += len(text)
+        self._compact(session)
+        self._enforce_caps()
+        return session
+
+    def render(self, session_id):
+        """Prompt-ready transcript of the session (summary + recent turns), or '' if none."""
+        session = self.get(session_id, create=False)
+        if session is None:
+            return ''
+        lines = []
+        if session.summary:
+            lines.append(f"Earlier in this conversation: {session.summary}")
+        for role, text in session.turns:
+            lines.append(f"{role.capitalize()}: {text}")
+        return '\n'.join(lines)
+
+    def drop(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.total_chars -= session.size
+
+    def stats(self):
+        return {
+            'sessions': len(self.sessions),
+            'chars': self.total_chars,
+            'evicted': self.evicted
+        }
+
+    def _compact(self, session):
+        # Fold the oldest turns into the summary until the budget fits,
+        # always keeping the latest turn verbatim.
+        while session.tokens > self.token_budget and len(session.turns) > 1:
+            role, text = session.turns.popleft()
+            session.tokens -= estimate_tokens(text)
+            session.size -= len(text)
+            self.total_chars -= len(text)
+            gist = text if len(text) <= 120 else text[:117] + '...'
+            self._set_summary(session, f"{session.summary} {role} said: {gist}".strip())
+
+    def _set_summary(self, session, summary):
+        # The summary gets at most half the budget, so recent turns always have room
+        max_chars = min(self.summary_tokens, self.token_budget // 2) * 4
+        if len(summary) > max_chars:
+            # Keep the most recent part of the summary
+            summary = '...' + summary[-(max_chars - 3):]
+        delta = len(summary) - len(session.summary)
+        session.tokens += estimate_tokens(summary) - (estimate_tokens(session.summary) if session.summary else 0)
+        session.size += delta
+        self.total_chars += delta
+        session.summary = summary
+
+    def _expire_idle(self):
+        cutoff = self.clock() - self.idle_ttl
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_seen >= cutoff:
+                break
+            self.drop(session_id)
+            self.evicted += 1
+
+    def _enforce_caps(self):
+        while self.sessions and (len(self.sessions) > self.max_sessions or self.total_chars > self.max_chars):
+            session_id = next(iter(self.sessions))
+            self.drop(session_id)
+            self.evicted += 1
@@ -0,0 +1,134 @@
+# 📬 Durable background jobs
+#
+# Jobs live in a MySQL `jobs` table so they survive restarts and can be
+# picked up by any worker. A worker claims a job with a conditional UPDATE
+# (queued -> running), so two workers never run the same job. Failures are
+# retried with exponential backoff until max_attempts; jobs left `running`
+# by a crashed worker are requeued once their lease expires.
+import json
+import random
+from datetime import timedelta
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           BIGINT AUTO_INCREMENT PRIMARY KEY,
+    kind         VARCHAR(64) NOT NULL,
+    payload      TEXT NOT NULL,
+    status       VARCHAR(16) NOT NULL DEFAULT 'queued',
+    attempts     INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_at       DATETIME NOT NULL,
+    locked_by    VARCHAR(64),
+    locked_at    DATETIME,
+    last_error   TEXT,
+    created_at   DATETIME NOT NULL,
+    updated_at   DATETIME NOT NULL,
+    INDEX (status, run_at)
+)
+"""
+
+JOB_STATES = {
+    'QUEUED': 'queued',
+    'RUNNING': 'running',
+    'DONE': 'done',
+    'FAILED': 'failed'
+}
+
+# kind -> callable(payload); register with @job_handler('kind')
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def ensure_jobs_table(cur):
+    cur.execute(JOBS_SCHEMA)
+
+
+def enqueue(cur, kind, payload, now, delay=0, max_attempts=5):
+    """Insert a job; the caller commits (so it can share the caller's transaction)."""
+    cur.execute(
+        "INSERT INTO jobs (kind, payload, status, max_attempts, run_at, created_at, updated_at) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        (kind, json.dumps(payload), JOB_STATES['QUEUED'], max_attempts,
+         now + timedelta(seconds=delay), now, now)
+    )
+    return cur.lastrowid
+
+
+def claim_next(cur, conn, worker_id, now):
+    """Claim the next due job for this worker, or return None."""
+    cur.execute(
+        "SELECT id FROM jobs WHERE status = %s AND run_at <= %s ORDER BY run_at LIMIT 5",
+        (JOB_STATES['QUEUED'], now)
+    )
+    for candidate in cur.fetchall():
+        cur.execute(
+            "UPDATE jobs SET status = %s, attempts = attempts + 1, locked_by = %s, locked_at = %s, "
+            "updated_at = %s WHERE id = %s AND status = %s",
+            (JOB_STATES['RUNNING'], worker_id, now, now, candidate['id'], JOB_STATES['QUEUED'])
+        )
+        conn.commit()
+        if cur.rowcount:
+            cur.execute("SELECT * FROM jobs WHERE id = %s", (candidate['id'],))
+            job = cur.fetchone()
+            conn.commit()
+            return job
+    conn.commit()
+    return None
+
+
+def complete(cur, conn, job, now):
+    cur.execute(
+        "UPDATE jobs SET status = %s, locked_by = NULL, last_error = NULL, updated_at = %s WHERE id = %s",
+        (JOB_STATES['DONE'], now, job['id'])
+    )
+    conn.commit()
+
+
+def backoff_seconds(attempts, base=30, cap=3600):
+    """Exponential backoff with jitter: ~30s, 60s, 120s, ... capped at an hour."""
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def fail(cur, conn, job, error, now):
+    """Record a failure; requeue with backoff or give up after max_attempts. Returns the new status."""
+    if job['attempts'] >= job['max_attempts']:
+        status, run_at = JOB_STATES['FAILED'], job['run_at']
+    else:
+        status, run_at = JOB_STATES['QUEUED'], now + timedelta(seconds=backoff_seconds(job['attempts']))
+    cur.execute(
+        "UPDATE jobs SET status = %s, run_at = %s, locked_by = NULL, last_error = %s, updated_at = %s "
+        "WHERE id = %s",
+        (status, run_at, str(error)[:2000], now, job['id'])
+    )
+    conn.commit()
+    return status
+
+
+def requeue_stale(cur, conn, lease_seconds, now):
+    """Give back jobs whose worker died mid-run; returns how many were requeued."""
+    cur.execute(
+        "UPDATE jobs SET status = %s, locked_by = NULL, updated_at = %s "
+        "WHERE status = %s AND locked_at < %s",
+        (JOB_STATES['QUEUED'], now, JOB_STATES['RUNNING'], now - timedelta(seconds=lease_seconds))
+    )
+    conn.commit()
+    return cur.rowcount
+
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job['kind'])
+    if handler is None:
+        raise LookupError(f"No handler registered for job kind '{job['kind']}'")
+    handler(json.loads(job['payload']))
+
+
+def queue_stats(cur):
+    cur.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+    return {row['status']: int(row['n']) for row in cur.fetchall()}
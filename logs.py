@@ -0,0 +1,159 @@
+# 🪵 Structured JSON logging
+#
+# Every record is one JSON line carrying an event name plus correlation IDs
+# (HTTP request_id, Socket.IO sid, chat_id). Handlers only enqueue records;
+# a listener drains the queue and does the actual I/O so logging never
+# blocks a request's green thread. When the queue is full, records are
+# dropped and counted (log_stats()) rather than blocking or erroring.
+#
+# Environment:
+#   LOG_LEVEL=INFO                          default level for all subsystems
+#   LOG_LEVELS=socket=WARNING,support=DEBUG per-subsystem overrides
+#   LOG_SAMPLE=connect=0.1,typing=0.01      keep only a fraction of noisy events
+#                                           (defaults to DEFAULT_SAMPLE below)
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+ROOT_LOGGER = 'shopnex'
+
+# Attributes every LogRecord has; anything else came from log_event(**fields)
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+DEFAULT_SAMPLE = 'connect=0.1,disconnect=0.1,typing=0.01'
+
+_listener = None
+_handler = None
+
+
+def parse_pairs(value):
+    """'a=1,b=2' -> {'a': '1', 'b': '2'}; blank or malformed items are ignored."""
+    pairs = {}
+    for item in (value or '').split(','):
+        key, sep, val = item.partition('=')
+        if sep and key.strip():
+            pairs[key.strip()] = val.strip()
+    return pairs
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        # Queued records arrive with the traceback already in exc_text
+        exc = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if exc:
+            entry['exc'] = exc
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Attach request_id / sid from the current Flask or Socket.IO request."""
+
+    def filter(self, record):
+        if has_request_context():
+            if getattr(record, 'request_id', None) is None:
+                record.request_id = g.get('request_id')
+            if getattr(record, 'sid', None) is None:
+                record.sid = getattr(request, 'sid', None)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Drop a share of high-volume events; warnings and errors always pass."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+class JsonQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps the traceback out of msg and never blocks or errors on a full queue."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock prepare() folds the traceback into msg; format it into
+        # exc_text instead so JsonFormatter can emit it as its own field
+        record = logging.makeLogRecord(vars(record))
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(stream=None):
+    """Install the queued JSON handler on the 'shopnex' logger tree (idempotent)."""
+    global _listener, _handler
+    root = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        return root
+
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_pairs(os.getenv('LOG_LEVELS')).items():
+        if not name.startswith(ROOT_LOGGER):
+            name = f'{ROOT_LOGGER}.{name}'
+        logging.getLogger(name).setLevel(level.upper())
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    # queue.Queue is green-aware once eventlet has monkey patched threading
+    log_queue = queue.Queue(maxsize=10000)
+    handler = _handler = JsonQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    rates = {event: float(rate) for event, rate in parse_pairs(os.getenv('LOG_SAMPLE', DEFAULT_SAMPLE)).items()}
+    handler.addFilter(SamplingFilter(rates))
+    root.addHandler(handler)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return root
+
+
+def log_stats():
+    return {'queued': _handler.queue.qsize() if _handler else 0,
+            'dropped': _handler.dropped if _handler else 0}
+
+
+def get_logger(subsystem):
+    return logging.getLogger(f'{ROOT_LOGGER}.{subsystem}')
+
+
+def log_event(logger, event, msg=None, level=logging.INFO, exc_info=None, **fields):
+    """Log a structured event: log_event(log, 'chat_assigned', chat_id=..., agent_id=...)."""
+    if not logger.isEnabledFor(level):
+        return
+    fields['event'] = event
+    logger.log(level, msg or event, extra=fields, exc_info=exc_info)
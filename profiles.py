@@ -0,0 +1,83 @@
+# 👤 Compact customer profiles for agent-facing payloads
+#
+# A profile summarizes a customer from the catalog (tier, order count,
+# lifetime value, last order/payment, refund eligibility). Refund
+# eligibility comes from the catalog's RefundTable, so it matches
+# /reports/refunds. Profiles are computed once and kept in an LRU; the
+# catalog is loaded once per process, so entries only need recomputing
+# when the day rolls over (refund windows move).
+from collections import OrderedDict
+from datetime import date
+
+
+def build_profile(catalog, customer, today=None):
+    today = today or date.today()
+    user_orders = catalog.orders_by_user.get(customer['user_id'], [])
+    user_payments = [catalog.payments_by_id[o['paymentid']] for o in user_orders
+                     if o.get('paymentid') in catalog.payments_by_id]
+
+    lifetime_value = sum(p['amount'] for p in user_payments if p['status'] == 'success')
+    first_seen = min((p['timestamp'] for p in user_payments if p.get('timestamp')), default=None)
+
+    table = catalog.refund_table
+    rows = table.rows_by_user.get(customer['user_id'], [])
+    eligible, days_remaining = table.evaluate(today, rows)
+    refundable = [{'order_id': table.order_ids[row], 'days_remaining': int(remaining)}
+                  for row, ok, remaining in zip(rows, eligible, days_remaining) if ok]
+
+    last_order = user_orders[-1] if user_orders else None
+    last_payment = catalog.payments_by_id.get(last_order['paymentid']) if last_order else None
+    return {
+        'user_id': customer['user_id'],
+        'order_count': len(user_orders),
+        'lifetime_value': lifetime_value,
+        'member_since': first_seen[:10] if first_seen else None,
+        'last_order': {
+            'order_id': last_order['order_id'],
+            'product': last_order['product'],
+            'status': last_order['status'],
+            'delivered_on': last_order['delivered_on'],
+        } if last_order else None,
+        'last_payment_status': last_payment['status'] if last_payment else None,
+        'refund_eligible_orders': refundable,
+    }
+
+
+class ProfileCache:
+    def __init__(self, get_catalog, maxsize=5000, premium_ltv=500000, clock=date.today):
+        self.get_catalog = get_catalog
+        self.maxsize = maxsize
+        self.premium_ltv = premium_ltv
+        self.clock = clock
+        self.entries = OrderedDict()    # user_id -> (computed_on, profile)
+        self.hits = 0
+        self.misses = 0
+
+    def tier(self, profile):
+        if not profile['order_count']:
+            return 'new'
+        return 'premium' if profile['lifetime_value'] >= self.premium_ltv else 'regular'
+
+    def get(self, user_id):
+        """Profile for user_id, or None for unknown customers."""
+        today = self.clock()
+        entry = self.entries.get(user_id)
+        if entry is not None and entry[0] == today:
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        catalog = self.get_catalog()
+        customer = catalog.customers_by_id.get(user_id)
+        if customer is None:
+            return None
+        profile = build_profile(catalog, customer, today)
+        profile['tier'] = self.tier(profile)
+        self.entries[user_id] = (today, profile)
+        self.entries.move_to_end(user_id)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return profile
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,186 @@
+# ⏱️ Opt-in request profiling and slow-request capture
+#
+# A request (HTTP or Socket.IO event) is profiled when it asks for it or is
+# sampled. A profiled request books its time into named spans (db, llm,
+# format, ...) and, for one request at a time, runs cProfile. Finished
+# captures compete for a bounded min-heap that keeps only the slowest N.
+#
+# When a request is not profiled the only cost is span() finding no
+# capture on `g`, and get_db() handing out the plain cursor.
+#
+# cProfile hooks the OS thread, not the green thread: while a profiled
+# request waits on I/O, other greenlets that run in between show up in
+# its profile too. Span timings are exact per request.
+import cProfile
+import heapq
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+from flask import g, has_app_context
+
+
+class Capture:
+    __slots__ = ('name', 'reason', 'fields', 'started_at', 'began', 'spans', 'profile', 'duration_ms')
+
+    def __init__(self, name, reason, fields):
+        self.name = name
+        self.reason = reason
+        self.fields = fields
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.began = time.perf_counter()
+        self.spans = {}                 # span name -> seconds
+        self.profile = None
+        self.duration_ms = None
+
+    def add(self, span_name, seconds):
+        self.spans[span_name] = self.spans.get(span_name, 0.0) + seconds
+
+
+class RequestProfiler:
+    def __init__(self, sample_rate=0.0, keep=20, top_functions=25):
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.top_functions = top_functions
+        self.slowest = []               # min-heap of (duration_ms, seq, entry)
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.cprofile_busy = False
+        self.started = 0
+        self.finished = 0
+
+    def reason(self, requested=False):
+        """Why this request should be profiled ('requested' / 'sampled'), or None."""
+        if requested:
+            return 'requested'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def start(self, name, reason, **fields):
+        capture = Capture(name, reason, fields)
+        with self.lock:
+            take_cprofile = not self.cprofile_busy
+            self.cprofile_busy = self.cprofile_busy or take_cprofile
+            self.started += 1
+        if take_cprofile:
+            capture.profile = cProfile.Profile()
+            capture.profile.enable()
+        g.profile_capture = capture
+        return capture
+
+    def finish(self, capture, **fields):
+        capture.duration_ms = (time.perf_counter() - capture.began) * 1000
+        if capture.profile is not None:
+            capture.profile.disable()
+            with self.lock:
+                self.cprofile_busy = False
+        capture.fields.update(fields)
+        g.pop('profile_capture', None)
+        with self.lock:
+            self.finished += 1
+            if len(self.slowest) >= self.keep and capture.duration_ms <= self.slowest[0][0]:
+                return
+        # Only captures that make the cut pay for rendering their profile
+        entry = self.render(capture)
+        with self.lock:
+            item = (capture.duration_ms, next(self.seq), entry)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, item)
+            elif capture.duration_ms > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, item)
+
+    def render(self, capture):
+        spans = {name: round(seconds * 1000, 2) for name, seconds in capture.spans.items()}
+        entry = {
+            'name': capture.name,
+            'reason': capture.reason,
+            'started_at': capture.started_at,
+            'duration_ms': round(capture.duration_ms, 2),
+            'spans_ms': spans,
+            'unaccounted_ms': round(max(capture.duration_ms - sum(spans.values()), 0.0), 2),
+            **capture.fields,
+            'profile': None
+        }
+        if capture.profile is not None:
+            out = io.StringIO()
+            pstats.Stats(capture.profile, stream=out).sort_stats('cumulative').print_stats(self.top_functions)
+            entry['profile'] = out.getvalue()
+        return entry
+
+    def captures(self, include_profile=False):
+        with self.lock:
+            entries = [entry for _, _, entry in sorted(self.slowest, key=lambda item: -item[0])]
+        if include_profile:
+            return entries
+        return [{**entry, 'profile': None} for entry in entries]
+
+    def clear(self):
+        with self.lock:
+            self.slowest = []
+
+    def stats(self):
+        return {'sample_rate': self.sample_rate, 'keep': self.keep, 'started': self.started,
+                'finished': self.finished, 'kept': len(self.slowest)}
+
+
+def current_capture():
+    return g.get('profile_capture') if has_app_context() else None
+
+
+class _Span:
+    __slots__ = ('capture', 'name', 'began')
+
+    def __init__(self, capture, name):
+        self.capture = capture
+        self.name = name
+
+    def __enter__(self):
+        self.began = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.capture.add(self.name, time.perf_counter() - self.began)
+
+
+_NO_SPAN = nullcontext()
+
+
+def span(name):
+    """Context manager booking the enclosed block's wall time to a span of the current capture, if any."""
+    capture = current_capture()
+    return _NO_SPAN if capture is None else _Span(capture, name)
+
+
+class TimedCursor:
+    """DB cursor proxy that books execute/fetch time to the capture's 'db' span."""
+
+    def __init__(self, cursor, capture):
+        self._cursor = cursor
+        self._capture = capture
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method, *args, **kwargs):
+        began = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._capture.add('db', time.perf_counter() - began)
+
+    def execute(self, *args, **kwargs):
+        return self._timed(self._cursor.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(self._cursor.executemany, *args, **kwargs)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
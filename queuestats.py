@@ -0,0 +1,176 @@
+# 📊 Live queue and SLA statistics
+#
+# Aggregates are updated as chat events happen (waiting, assigned,
+# transferred, resolved) instead of being recomputed with SELECTs, so a
+# dashboard read is O(1) apart from the live waiting set. Wait-time
+# quantiles use the P² algorithm (Jain & Chlamtac, 1985): five markers per
+# quantile, constant memory, no stored samples. Wait statistics cover a
+# rolling window (SLA_WINDOW); the previous window's summary is kept for
+# comparison. State is per process, like the agent pool.
+import time
+from collections import deque
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile p in O(1) memory."""
+    __slots__ = ('p', 'n', 'heights', 'positions', 'desired', 'increments')
+
+    def __init__(self, p):
+        self.p = p
+        self.n = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.n += 1
+        q = self.heights
+        if self.n <= 5:
+            q.append(x)
+            if self.n == 5:
+                q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        pos = self.positions
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        # Nudge the three middle markers toward their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = height
+                pos[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        if not self.n:
+            return None
+        if self.n < 5:
+            ordered = sorted(self.heights)
+            return ordered[min(int(self.p * len(ordered)), len(ordered) - 1)]
+        return self.heights[2]
+
+
+class WaitWindow:
+    """Wait-time count, mean, max and quantiles for one SLA window."""
+
+    def __init__(self, started_at, quantiles):
+        self.started_at = started_at
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sketches = {p: P2Quantile(p) for p in quantiles}
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for sketch in self.sketches.values():
+            sketch.add(seconds)
+
+    def summary(self):
+        result = {
+            'since': round(self.started_at),
+            'count': self.count,
+            'avg_seconds': round(self.total / self.count, 1) if self.count else None,
+            'max_seconds': round(self.max, 1) if self.count else None,
+        }
+        for p, sketch in self.sketches.items():
+            value = sketch.value()
+            result[f'p{round(p * 100)}_seconds'] = round(value, 1) if value is not None else None
+        return result
+
+
+class QueueStats:
+    def __init__(self, window=3600, quantiles=(0.5, 0.95), clock=time.time):
+        self.window = window
+        self.quantiles = quantiles
+        self.clock = clock
+        self.waiting = {}               # chat_id -> epoch seconds it started waiting
+        self.current = WaitWindow(clock(), quantiles)
+        self.previous = None
+        self.resolved_times = deque()   # resolve timestamps within the last hour
+        self.totals = {'escalated': 0, 'assigned': 0, 'transferred': 0, 'resolved': 0,
+                       'auto_resolved': 0, 'abandoned': 0}
+
+    def _roll(self, now):
+        if now - self.current.started_at >= self.window:
+            self.previous = self.current.summary()
+            self.current = WaitWindow(now, self.quantiles)
+
+    def _trim_resolved(self, now):
+        while self.resolved_times and now - self.resolved_times[0] > 3600:
+            self.resolved_times.popleft()
+
+    def chat_waiting(self, chat_id, since=None, new=True):
+        """A chat entered the queue (escalated, requeued, or found waiting at start-up)."""
+        if chat_id not in self.waiting:
+            self.waiting[chat_id] = since if since is not None else self.clock()
+            if new:
+                self.totals['escalated'] += 1
+
+    def chat_assigned(self, chat_id):
+        now = self.clock()
+        self._roll(now)
+        since = self.waiting.pop(chat_id, None)
+        self.totals['assigned'] += 1
+        if since is not None:
+            self.current.add(max(now - since, 0.0))
+
+    def chat_transferred(self, chat_id):
+        self.totals['transferred'] += 1
+
+    def chat_resolved(self, chat_id, auto=False):
+        now = self.clock()
+        if self.waiting.pop(chat_id, None) is not None:
+            # Closed before any agent picked it up: nobody resolved anything
+            self.totals['abandoned'] += 1
+            return
+        self.totals['auto_resolved' if auto else 'resolved'] += 1
+        self.resolved_times.append(now)
+        self._trim_resolved(now)
+
+    def snapshot(self, agents=None):
+        """Current numbers; agents is an iterable of routing.AgentSlot."""
+        now = self.clock()
+        self._roll(now)
+        self._trim_resolved(now)
+        oldest = min(self.waiting.values(), default=None)
+        snapshot = {
+            'at': round(now),
+            'waiting': len(self.waiting),
+            'oldest_wait_seconds': round(now - oldest, 1) if oldest is not None else None,
+            'wait': self.current.summary(),
+            'previous_wait': self.previous,
+            'resolved_last_hour': len(self.resolved_times),
+            'totals': dict(self.totals),
+        }
+        if agents is not None:
+            online = available = busy = full = 0
+            for slot in agents:
+                online += 1
+                available += bool(slot.available and slot.free_slots)
+                busy += bool(slot.load)
+                full += not slot.free_slots
+            snapshot['agents'] = {'online': online, 'available': available, 'busy': busy, 'full': full}
+        return snapshot
@@ -0,0 +1,156 @@
+# 🚧 Token-bucket rate limiting
+#
+# Each rule allows `rate` requests per second with bursts up to `burst`.
+# A check is O(1): refill the key's bucket from the elapsed time, then try
+# to take a token. A request is checked against several keys (identifier,
+# sid, IP); it takes a token from every key's bucket only when all of them
+# have one, so a rejected request costs nothing. The in-memory backend is
+# per process (LRU-capped); the Redis backend shares buckets between
+# workers via an atomic Lua script.
+#
+# Rules come from RATE_LIMITS, e.g. "support=0.2/5,typing=5/10"
+# (name=rate_per_second/burst), layered over DEFAULT_RULES. A rule named
+# "<rule>:<key kind>" (e.g. "support:ip") overrides the rule for that kind
+# of key; IPs get looser limits since many customers can share one behind
+# an office or carrier NAT.
+import math
+import time
+from collections import OrderedDict
+
+DEFAULT_RULES = {
+    'support': (0.2, 5),            # /support: ~12 a minute, bursts of 5
+    'customer_message': (1.0, 10),
+    'escalate_request': (0.05, 3),
+    'typing': (5.0, 10),
+    'support:ip': (2.0, 50),
+    'customer_message:ip': (10.0, 100),
+    'escalate_request:ip': (0.5, 30),
+    'typing:ip': (50.0, 100),
+}
+
+
+def parse_rules(value):
+    rules = dict(DEFAULT_RULES)
+    for item in (value or '').split(','):
+        name, sep, spec = item.partition('=')
+        rate, slash, burst = spec.partition('/')
+        if sep and slash:
+            rules[name.strip()] = (float(rate), float(burst))
+    return rules
+
+
+class MemoryBackend:
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.buckets = OrderedDict()    # key -> [tokens, last_refill]
+        self.max_keys = max_keys
+        self.clock = clock
+
+    def take(self, key, rate, burst):
+        """Try to take one token; returns (allowed, retry_after_seconds)."""
+        allowed, retry_after, _ = self.take_all([(key, rate, burst)])
+        return allowed, retry_after
+
+    def take_all(self, requests):
+        """
+        Take one token from every (key, rate, burst) bucket, or from none.
+        Returns (allowed, retry_after_seconds, index of the first empty bucket).
+        """
+        now = self.clock()
+        levels = []
+        for i, (key, rate, burst) in enumerate(requests):
+            bucket = self.buckets.get(key)
+            tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+            if tokens < 1:
+                return False, (1 - tokens) / rate, i
+            levels.append(tokens)
+        for (key, _, _), tokens in zip(requests, levels):
+            self.buckets[key] = [tokens - 1, now]
+            self.buckets.move_to_end(key)
+        while len(self.buckets) > self.max_keys:
+            # Oldest buckets have refilled long ago, so dropping them is harmless
+            self.buckets.popitem(last=False)
+        return True, 0.0, None
+
+
+class RedisBackend:
+    # KEYS: buckets; ARGV: now, then rate and burst for each bucket.
+    # Returns {0, ''} when every bucket gave a token, else {index, tokens} of
+    # the first empty one (1-based) and leaves all buckets untouched.
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    levels[i] = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    if levels[i] < 1 then
+        return {i, tostring(levels[i])}
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', key, 'tokens', levels[i] - 1, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return {0, ''}
+"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, rate, burst):
+        allowed, retry_after, _ = self.take_all([(key, rate, burst)])
+        return allowed, retry_after
+
+    def take_all(self, requests):
+        args = [time.time()]
+        for _, rate, burst in requests:
+            args += [rate, burst]
+        index, tokens = self.script(keys=[self.prefix + key for key, _, _ in requests], args=args)
+        if not index:
+            return True, 0.0, None
+        rate = requests[index - 1][1]
+        return False, (1 - float(tokens)) / rate, index - 1
+
+
+class RateLimiter:
+    def __init__(self, backend, rules):
+        self.backend = backend
+        self.rules = rules
+        # Per-kind overrides ('support:ip') count towards their base rule
+        self.allowed = {name: 0 for name in rules if ':' not in name}
+        self.rejected = {name: 0 for name in rules if ':' not in name}
+
+    def check(self, rule, **keys):
+        """
+        Check every non-empty key (e.g. ip=..., sid=..., identifier=...) against the rule,
+        or its '<rule>:<kind>' override. Tokens are taken only if every key passes.
+        Returns (allowed, retry_after_seconds, rejected_key_kind).
+        """
+        if rule not in self.rules:
+            return True, 0.0, None
+        kinds, requests = [], []
+        for kind, value in keys.items():
+            if not value:
+                continue
+            rate, burst = self.rules.get(f'{rule}:{kind}', self.rules[rule])
+            kinds.append(kind)
+            requests.append((f'{rule}:{kind}:{value}', rate, burst))
+        ok, retry_after, index = self.backend.take_all(requests) if requests else (True, 0.0, None)
+        if not ok:
+            self.rejected[rule] += 1
+            return False, math.ceil(retry_after * 10) / 10, kinds[index]
+        self.allowed[rule] += 1
+        return True, 0.0, None
+
+    def stats(self):
+        return {name: {'allowed': self.allowed[name], 'rejected': self.rejected[name]}
+                for name in self.allowed}
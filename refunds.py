@@ -0,0 +1,78 @@
+# 💸 Refund eligibility over the whole orders table
+#
+# support_policy.json may narrow or widen the default window:
+#   "refund_window_days": 5,
+#   "product_refund_window_days": {"p003": 0},
+#   "payment_method_refund_window_days": {"paystack": 7}
+# A product rule beats a payment-method rule, which beats the default.
+from datetime import date
+
+import numpy as np
+
+
+def refund_window_for(order, payment, policy):
+    """Refund window in days for one order under the (possibly per-product/per-method) policy."""
+    product_windows = policy.get('product_refund_window_days') or {}
+    if order['product'] in product_windows:
+        return product_windows[order['product']]
+    method_windows = policy.get('payment_method_refund_window_days') or {}
+    if payment and payment.get('method') in method_windows:
+        return method_windows[payment['method']]
+    return policy['refund_window_days']
+
+
+class RefundTable:
+    """
+    Delivery dates and refund windows for every order, pre-parsed into
+    NumPy arrays so eligibility for all orders is a couple of vector ops.
+    """
+
+    def __init__(self, orders, payments_by_id, policy):
+        self.order_ids = [o['order_id'] for o in orders]
+        self.user_ids = [o['userid'] for o in orders]
+        # NaT marks orders that haven't been delivered
+        self.delivered_on = np.array(
+            [o['delivered_on'] or 'NaT' for o in orders], dtype='datetime64[D]')
+        self.window_days = np.array(
+            [refund_window_for(o, payments_by_id.get(o.get('paymentid')), policy) for o in orders],
+            dtype=np.int32)
+        self.row_by_order = {order_id: i for i, order_id in enumerate(self.order_ids)}
+        self.rows_by_user = {}
+        for i, user_id in enumerate(self.user_ids):
+            self.rows_by_user.setdefault(user_id, []).append(i)
+
+    def __len__(self):
+        return len(self.order_ids)
+
+    def evaluate(self, today=None, rows=None):
+        """
+        Returns (eligible, days_remaining) arrays aligned with self.order_ids,
+        or with `rows` (row indexes, e.g. from rows_by_user) when given.
+        days_remaining is negative once the window has closed and is
+        meaningless (0) where eligible is False because of no delivery.
+        """
+        today = np.datetime64(today or date.today(), 'D')
+        delivered_on, window_days = self.delivered_on, self.window_days
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.intp)
+            delivered_on, window_days = delivered_on[rows], window_days[rows]
+        delivered = ~np.isnat(delivered_on)
+        days_since = np.where(delivered, (today - delivered_on).astype(np.int64), 0)
+        days_remaining = np.where(delivered, window_days - days_since, 0)
+        eligible = delivered & (days_remaining >= 0)
+        return eligible, days_remaining
+
+    def report(self, today=None, eligible_only=False):
+        """Per-order rows ready for JSON: order/user ids, eligibility and days remaining."""
+        eligible, days_remaining = self.evaluate(today)
+        delivered = ~np.isnat(self.delivered_on)
+        rows = []
+        for i in (np.flatnonzero(eligible) if eligible_only else range(len(self))):
+            rows.append({
+                'order_id': self.order_ids[i],
+                'userid': self.user_ids[i],
+                'refund_window_days': int(self.window_days[i]),
+                'eligible': bool(eligible[i]),
+                'days_remaining': int(days_remaining[i]) if delivered[i] else None,
+            })
+        return rows
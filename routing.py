@@ -0,0 +1,114 @@
+# 🧭 Agent capacity and chat routing
+#
+# Each agent can hold several concurrent chats (their capacity). New work
+# goes to the least-loaded available agent, measured as the share of
+# capacity in use, so load spreads evenly before anyone is filled up.
+# State is per process; the chats/agents tables remain the source of truth
+# for chat state.
+
+
+class AgentSlot:
+    __slots__ = ('agent_id', 'name', 'capacity', 'chats', 'available')
+
+    def __init__(self, agent_id, name, capacity):
+        self.agent_id = agent_id
+        self.name = name
+        self.capacity = capacity
+        self.chats = {}           # chat_id -> None, used as an insertion-ordered set
+        self.available = False    # opted in to receive chats (agent_available)
+
+    @property
+    def load(self):
+        return len(self.chats)
+
+    @property
+    def free_slots(self):
+        return max(self.capacity - len(self.chats), 0)
+
+
+class AgentPool:
+    def __init__(self, default_capacity=3, max_capacity=10):
+        self.default_capacity = default_capacity
+        self.max_capacity = max_capacity
+        self.agents = {}
+        self.chat_agent = {}      # chat_id -> agent_id
+
+    def clamp_capacity(self, capacity):
+        """Client-supplied capacity as an int in [1, max_capacity]; None if missing or not a number."""
+        try:
+            capacity = int(capacity)
+        except (TypeError, ValueError):
+            return None
+        return min(max(capacity, 1), self.max_capacity)
+
+    def register(self, agent_id, name=None, capacity=None):
+        capacity = self.clamp_capacity(capacity)
+        slot = self.agents.get(agent_id)
+        if slot is None:
+            slot = self.agents[agent_id] = AgentSlot(agent_id, name, capacity or self.default_capacity)
+        else:
+            slot.name = name or slot.name
+            slot.capacity = capacity or slot.capacity
+        return slot
+
+    def unregister(self, agent_id):
+        """Forget an agent; returns the chats they were holding."""
+        slot = self.agents.pop(agent_id, None)
+        if slot is None:
+            return []
+        for chat_id in slot.chats:
+            self.chat_agent.pop(chat_id, None)
+        return list(slot.chats)
+
+    def set_available(self, agent_id, available=True):
+        slot = self.agents.get(agent_id) or self.register(agent_id)
+        slot.available = available
+        return slot
+
+    def pick_agent(self):
+        """Least-loaded available agent with a free slot, or None."""
+        best = None
+        for slot in self.agents.values():
+            if not slot.available or slot.free_slots == 0:
+                continue
+            if best is None or (slot.load / slot.capacity, slot.load) < (best.load / best.capacity, best.load):
+                best = slot
+        return best
+
+    def assign(self, agent_id, chat_id):
+        """Record chat_id as held by agent_id (moving it off any previous agent)."""
+        self.release(chat_id)
+        slot = self.agents.get(agent_id) or self.register(agent_id)
+        slot.chats[chat_id] = None
+        self.chat_agent[chat_id] = agent_id
+        return slot
+
+    def release(self, chat_id):
+        """Drop chat_id from whoever holds it; returns that agent's id or None."""
+        agent_id = self.chat_agent.pop(chat_id, None)
+        slot = self.agents.get(agent_id)
+        if slot is not None:
+            slot.chats.pop(chat_id, None)
+        return agent_id
+
+    def agent_of(self, chat_id):
+        return self.chat_agent.get(chat_id)
+
+    def is_full(self, agent_id):
+        slot = self.agents.get(agent_id)
+        return slot is not None and slot.free_slots == 0
+
+    def latest_chat(self, agent_id):
+        slot = self.agents.get(agent_id)
+        if slot is None or not slot.chats:
+            return None
+        return next(reversed(slot.chats))
+
+    def snapshot(self):
+        return [{
+            'agent_id': slot.agent_id,
+            'name': slot.name,
+            'capacity': slot.capacity,
+            'active_chats': list(slot.chats),
+            'available': slot.available
+        } for slot in self.agents.values()]
@@ -1,30 +1,55 @@
 import eventlet
-from dotenv import load_dotenv
 eventlet.monkey_patch()
+from dotenv import load_dotenv
 load_dotenv()
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify, g
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from datetime import datetime
 import json
 import os
+import math
+import threading
+import time
 from flask_cors import CORS
 from flask_mysqldb import MySQL
+from flask_mail import Mail, Message
+from eventlet import tpool
+import socket
 import uuid
-from google import genai
 import re
 import html
+from catalog import get_catalog
+from conversation import ConversationMemory
+from routing import AgentPool
+from timers import TimerWheel, chat_timeout_action, EXPIRE, REQUEUE, AUTO_RESOLVE
+from transcripts import TranscriptIndex
+from profiles import ProfileCache
+from ratelimit import MemoryBackend, RateLimiter, RedisBackend, parse_rules
+from archive import archive_batch, archive_report, ensure_archive_table, iter_archived_chats, load_messages
+from jobs import (claim_next, complete, enqueue, ensure_jobs_table, fail, job_handler, queue_stats,
+                  requeue_stale, run_job, JOB_STATES)
+from transcript_pdf import render_transcript_pdf
+from profiling import RequestProfiler, TimedCursor, current_capture, span
+from queuestats import QueueStats
+import wire
+from datetime import timedelta
+from functools import wraps
+from logs import setup_logging, get_logger, log_event, log_stats
+import logging
 
-eventlet.monkey_patch()
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+# Handlers are installed by create_app(); importing this module starts no threads
+support_log = get_logger('support')
+socket_log = get_logger('socket')
+agent_log = get_logger('agents')
+chat_log = get_logger('chats')
+startup_log = get_logger('startup')
+job_log = get_logger('jobs')
 
-app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST')
-app.config['MYSQL_USER'] = os.getenv('MYSQL_USER')
-app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD')
-app.config['MYSQL_DB'] = os.getenv('MYSQL_DB')
-app.config['MYSQL_PORT'] = int(os.getenv('MYSQL_PORT', 3306))
-mysql = MySQL(app)
+# Extensions are bound to the app in create_app(); routes live on the blueprint
+api = Blueprint('api', __name__)
+socketio = SocketIO()
+mysql = MySQL()
+mail = Mail()
 
 PORT = int(os.environ.get('PORT', 5000))  
 # Chat States
@@ -42,46 +67,401 @@ WS_EVENTS = {
     'NEW_MESSAGE': 'new_message',
     'CHAT_RESOLVED': 'chat_resolved',
     'CHAT_ESCALATED': 'chat_escalated',  # Added for frontend compatibility
-    'ESCALATE_REQUEST': 'escalate_request'  # Added for frontend compatibility
+    'ESCALATE_REQUEST': 'escalate_request',  # Added for frontend compatibility
+    'QUEUE_STATS': 'queue_stats'
 }
 
-# 🔑 Configure your Gemini API key
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# 💬 Per-session /support memory (bounded per session and overall)
+conversation_memory = ConversationMemory(
+    token_budget=int(os.getenv('CONVERSATION_TOKEN_BUDGET', 800)),
+    idle_ttl=int(os.getenv('CONVERSATION_IDLE_TTL', 1800)),
+    max_sessions=int(os.getenv('CONVERSATION_MAX_SESSIONS', 10000)),
+    max_chars=int(os.getenv('CONVERSATION_MAX_CHARS', 32 * 1024 * 1024))
+)
+# Escalate when the same fast-path question keeps coming back in one session
+REPEAT_ESCALATION_THRESHOLD = 3
+
+# 🧭 Concurrent chats per agent (overridable per agent at agent_login)
+agent_pool = AgentPool(default_capacity=int(os.getenv('AGENT_CHAT_CAPACITY', 3)),
+                       max_capacity=int(os.getenv('AGENT_MAX_CAPACITY', 10)))
+
+# ⏱️ Sweeper timeouts (seconds)
+CHAT_WAITING_TIMEOUT = int(os.getenv('CHAT_WAITING_TIMEOUT', 900))    # customer gave up waiting
+CHAT_IDLE_TIMEOUT = int(os.getenv('CHAT_IDLE_TIMEOUT', 1800))         # assigned chat gone quiet
+AGENT_CHECK_INTERVAL = int(os.getenv('AGENT_CHECK_INTERVAL', 60))     # is the agent's socket still there?
+AGENT_RECONNECT_GRACE = int(os.getenv('AGENT_RECONNECT_GRACE', 30))   # after a disconnect
+sweeper_timers = TimerWheel(tick=1.0)
+SWEEPER_STATS = {'expired': 0, 'auto_resolved': 0, 'requeued': 0, 'agents_dropped': 0}
+
+# 📦 Wire protocol per connection (see wire.py); only compact-protocol sids are recorded
+client_protocols = {}
+
+def is_compact(sid):
+    return client_protocols.get(sid) == wire.COMPACT
+
+def emit_chat_event(event, room, legacy, compact):
+    """Emit `legacy` as JSON to old clients in room and `compact` as MessagePack to protocol-2 clients."""
+    if not client_protocols:
+        socketio.emit(event, legacy, room=room)
+        return
+    sids = [sid for sid, _ in socketio.server.manager.get_participants('/', room)]
+    compact_sids = [sid for sid in sids if sid in client_protocols]
+    if len(compact_sids) < len(sids):
+        socketio.emit(event, legacy, room=room, skip_sid=compact_sids or None)
+    if compact_sids:
+        packed = wire.pack(compact)
+        for sid in compact_sids:
+            socketio.emit(event, packed, to=sid)
+
+def emit_history(chat_id, messages, legacy_messages, after=None):
+    """Reply to the requesting socket with a chat's history in its protocol."""
+    if is_compact(request.sid):
+        emit('chat_history', wire.pack(wire.history(chat_id, messages, wire.parse_after(after))))
+    else:
+        emit('chat_history', {'chat_id': chat_id, 'messages': legacy_messages})
+
+# 📊 Queue/SLA numbers kept up to date by chat events; broadcast to the 'supervisors' room
+sla_stats = QueueStats(window=int(os.getenv('SLA_WINDOW', 3600)))
+QUEUE_STATS_INTERVAL = float(os.getenv('QUEUE_STATS_INTERVAL', 5))   # 0 disables the broadcast
+SUPERVISORS_ROOM = 'supervisors'
+
+# 🔑 Gemini client, created on first use (importing google.genai is slow)
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+def get_llm_client():
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                from google import genai
+                _llm_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    return _llm_client
 
 def get_db():
-    return mysql.connection.cursor()
+    cur = mysql.connection.cursor()
+    capture = current_capture()
+    return TimedCursor(cur, capture) if capture else cur
+
+# 🧱 Tables the app creates itself. MySQL DDL commits implicitly, so this runs during
+# warm-up, or at the start of a handler before it has written anything
+_schema_ready = False
+
+def ensure_schema():
+    global _schema_ready
+    if not _schema_ready:
+        cur = get_db()
+        ensure_jobs_table(cur)
+        ensure_archive_table(cur)
+        _schema_ready = True
+
+def read_messages(chat_id):
+    """A chat's messages from the hot table or the archive; None if unknown."""
+    ensure_schema()
+    return load_messages(get_db(), chat_id)
+
+# 👤 Cached customer profiles for escalation/assignment payloads
+profile_cache = ProfileCache(
+    get_catalog,
+    maxsize=int(os.getenv('PROFILE_CACHE_SIZE', 5000)),
+    premium_ltv=int(os.getenv('PREMIUM_LIFETIME_VALUE', 500000))
+)
+
+def customer_details(user_id, name=None, email=None, phone=None):
+    """customerDetails for agents: contact info plus the cached profile (tier, orders, refunds)."""
+    customer = get_catalog().customers_by_id.get(user_id) or {}
+    profile = profile_cache.get(user_id)
+    return {
+        'name': customer.get('name', name),
+        'email': customer.get('email', email),
+        'phone': customer.get('phone', phone or ''),
+        'type': profile['tier'] if profile else 'regular',
+        'memberSince': profile['member_since'] if profile else None,
+        'profile': profile
+    }
+
+# 🚧 Rate limits per identifier / IP / socket (RATE_LIMITS, RATE_LIMIT_REDIS_URL)
+rate_limiter = RateLimiter(
+    RedisBackend(os.getenv('RATE_LIMIT_REDIS_URL')) if os.getenv('RATE_LIMIT_REDIS_URL') else MemoryBackend(),
+    parse_rules(os.getenv('RATE_LIMITS'))
+)
+# Header carrying the real client IP when behind a proxy (Fly.io sets Fly-Client-IP)
+CLIENT_IP_HEADER = os.getenv('RATE_LIMIT_IP_HEADER', 'Fly-Client-IP')
+
+def client_ip():
+    return request.headers.get(CLIENT_IP_HEADER) or request.remote_addr
+
+def throttled(rule, silent=False):
+    """Socket.IO handler decorator: drop events over the rule's limit, keyed by sid and IP."""
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            allowed, retry_after, key = rate_limiter.check(rule, sid=request.sid, ip=client_ip())
+            if not allowed:
+                log_event(socket_log, 'rate_limited', level=logging.DEBUG, rule=rule, key=key)
+                if not silent:
+                    emit('error', {
+                        'message': 'Too many requests, please slow down',
+                        'code': 'rate_limited',
+                        'event': rule,
+                        'retry_after': retry_after
+                    })
+                return
+            return handler(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# 🔐 Staff-only HTTP endpoints require STAFF_API_TOKEN (disabled if unset)
+def is_staff_request():
+    token = os.getenv('STAFF_API_TOKEN')
+    return bool(token) and request.headers.get('Authorization') == f'Bearer {token}'
+
+def staff_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not os.getenv('STAFF_API_TOKEN'):
+            return jsonify({'error': 'Staff API is disabled; set STAFF_API_TOKEN'}), 403
+        if not is_staff_request():
+            return jsonify({'error': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+# ⏱️ Request profiling: staff can ask with `X-Profile: 1`; PROFILE_SAMPLE_RATE samples the rest
+profiler = RequestProfiler(
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+    keep=int(os.getenv('PROFILE_KEEP', 20))
+)
+
+def profiled(event):
+    """Socket.IO handler decorator: profile a sample of this event's invocations."""
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            reason = profiler.reason()
+            if reason is None:
+                return handler(*args, **kwargs)
+            capture = profiler.start(f'socket:{event}', reason, sid=request.sid)
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                profiler.finish(capture)
+        return wrapper
+    return decorator
+
+# 🔎 Transcript search index (local SQLite FTS5, opened on first use)
+transcript_index = TranscriptIndex(os.getenv(
+    'TRANSCRIPT_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'transcripts.db')
+))
+
+def index_transcript(action, *args, **kwargs):
+    """Update the search index; failures are logged, never raised into chat handling."""
+    try:
+        getattr(transcript_index, action)(*args, **kwargs)
+    except Exception as e:
+        log_event(chat_log, 'transcript_index_failed', level=logging.WARNING, exc_info=e, action=action)
+
+# 💡 Suggested replies from resolved chats (NumPy BM25 index, created on first use)
+SUGGESTION_INDEX_MAX_CHATS = int(os.getenv('SUGGESTION_INDEX_MAX_CHATS', 100000))
+SUGGESTIONS_PER_MESSAGE = 3
+_suggestion_index = None
 
-# 📦 Utility to load JSON files from /mock folder
-def load_data(filename):
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    with open(os.path.join(base_path, 'mock', filename), 'r') as f:
-        return json.load(f)
+def customer_names():
+    """Every catalog customer's name, masked in indexed replies alongside the chat's own customer."""
+    return [customer['name'] for customer in get_catalog().customers_by_id.values()]
 
-# Load all mock data into memory
-customers = load_data('customers.json')
-products = load_data('products.json')
-orders = load_data('orders.json')
-payments = load_data('payments.json')
-policy = load_data('support_policy.json')
+def get_suggestion_index():
+    global _suggestion_index
+    if _suggestion_index is None:
+        from suggestions import SuggestionIndex
+        _suggestion_index = SuggestionIndex(known_names=customer_names())
+    return _suggestion_index
+
+def backfill_suggestion_index():
+    """Load the most recent resolved chats into the suggestion index, yielding between batches."""
+    global _suggestion_index
+    ensure_schema()
+    # Start from an empty index so a retried warm-up doesn't load the same chats twice
+    from suggestions import SuggestionIndex
+    index = _suggestion_index = SuggestionIndex(known_names=customer_names())
+    cur = get_db()
+    cur.execute(
+        "SELECT customer_name, messages FROM chats WHERE state = %s ORDER BY resolved_at DESC LIMIT %s",
+        (CHAT_STATES['RESOLVED'], SUGGESTION_INDEX_MAX_CHATS)
+    )
+    loaded = 0
+    for chat in cur.fetchall():
+        if chat['messages']:
+            index.add_chat(json.loads(chat['messages']), chat['customer_name'])
+        loaded += 1
+        if loaded % 500 == 0:
+            socketio.sleep(0)
+    # Anything older has been moved to the archive (resolved longer ago than every hot chat)
+    if loaded >= SUGGESTION_INDEX_MAX_CHATS:
+        return
+    for batch in iter_archived_chats(cur, ARCHIVE_BATCH_SIZE):
+        for chat in batch[:SUGGESTION_INDEX_MAX_CHATS - loaded]:
+            index.add_chat(chat['messages'], chat['customer_name'])
+        loaded += len(batch)
+        if loaded >= SUGGESTION_INDEX_MAX_CHATS:
+            return
+        socketio.sleep(0)
+
+def push_suggestions(agent_id, chat_id, text):
+    """Send the agent top-k replies that resolved similar questions before."""
+    if not agent_id or not text:
+        return
+    try:
+        suggestions = get_suggestion_index().suggest(text, k=SUGGESTIONS_PER_MESSAGE)
+    except Exception as e:
+        log_event(chat_log, 'suggestions_failed', level=logging.WARNING, exc_info=e, chat_id=chat_id)
+        return
+    if suggestions:
+        socketio.emit('suggested_replies', {'chat_id': chat_id, 'suggestions': suggestions}, room=agent_id)
+
+def seed_queue_stats():
+    """Count chats already waiting when this process starts (waits measured from created_at)."""
+    cur = get_db()
+    cur.execute("SELECT id, created_at FROM chats WHERE state = %s", (CHAT_STATES['WAITING'],))
+    for chat in cur.fetchall():
+        sla_stats.chat_waiting(chat['id'], since=chat['created_at'].timestamp(), new=False)
+
+TRANSCRIPT_BACKFILL_BATCH = int(os.getenv('TRANSCRIPT_BACKFILL_BATCH', 500))
+
+_transcript_backfill_pending = None
+
+def backfill_transcript_index():
+    """Index existing chats from MySQL the first time the local index is created."""
+    global _transcript_backfill_pending
+    # Decided once per process: a retry after a partial backfill must not see a non-empty index and stop
+    if _transcript_backfill_pending is None:
+        _transcript_backfill_pending = transcript_index.is_empty()
+    if not _transcript_backfill_pending:
+        return
+    ensure_schema()
+    cur = get_db()
+    # Page through by id so neither memory nor a single uninterrupted run grows with the table
+    last_id = ''
+    while True:
+        cur.execute(
+            "SELECT id, customer_id, customer_name, case_number, state, created_at, messages FROM chats "
+            "WHERE id > %s ORDER BY id LIMIT %s",
+            (last_id, TRANSCRIPT_BACKFILL_BATCH)
+        )
+        chats = cur.fetchall()
+        if not chats:
+            break
+        for chat in chats:
+            transcript_index.add_chat(
+                chat['id'], chat['customer_id'], chat['customer_name'], chat['case_number'], chat['state'],
+                chat['created_at'].isoformat(), json.loads(chat['messages']) if chat['messages'] else []
+            )
+        last_id = chats[-1]['id']
+        socketio.sleep(0)
+    for batch in iter_archived_chats(cur, ARCHIVE_BATCH_SIZE):
+        for chat in batch:
+            transcript_index.add_chat(
+                chat['id'], chat['customer_id'], chat['customer_name'], chat['case_number'],
+                CHAT_STATES['RESOLVED'], chat['created_at'].isoformat(), chat['messages']
+            )
+        socketio.sleep(0)
+    _transcript_backfill_pending = False
+
+# 🚦 Warm-up state reported by /ready (separate from /health liveness)
+WARMUP = {
+    'started_at': None,
+    'completed_at': None,
+    'steps': {'catalog': False, 'refund_table': False, 'llm_client': False, 'database': False, 'schema': False,
+              'transcript_index': False, 'suggestion_index': False, 'queue_stats': False},
+    'errors': {},
+    'attempts': 0,
+    'skipped': False        # WARMUP=0: everything initializes lazily on first use
+}
+
+WARMUP_RETRY_MAX = float(os.getenv('WARMUP_RETRY_MAX', 60))   # cap on the backoff between attempts
+
+def warm_up(app):
+    """
+    Build indexes, create the LLM client and open a DB connection before traffic arrives.
+    Failed steps (e.g. MySQL briefly unreachable at boot) are retried with exponential
+    backoff until every step has succeeded, so the instance eventually becomes ready.
+    """
+    WARMUP['started_at'] = datetime.now().isoformat()
+    steps = [
+        ('catalog', get_catalog, False),
+        ('refund_table', lambda: get_catalog().refund_table, False),
+        ('llm_client', get_llm_client, False),
+        ('database', lambda: mysql.connection.ping(), True),
+        ('schema', ensure_schema, True),
+        ('transcript_index', backfill_transcript_index, True),
+        ('suggestion_index', backfill_suggestion_index, True),
+        ('queue_stats', seed_queue_stats, True),
+    ]
+    delay = 1.0
+    while True:
+        WARMUP['attempts'] += 1
+        for name, step, needs_app in steps:
+            if WARMUP['steps'][name]:
+                continue
+            began = time.perf_counter()
+            try:
+                if needs_app:
+                    with app.app_context():
+                        step()
+                else:
+                    step()
+                WARMUP['steps'][name] = True
+                WARMUP['errors'].pop(name, None)
+                log_event(startup_log, 'warmup_step', step=name,
+                          ms=round((time.perf_counter() - began) * 1000, 1))
+            except Exception as e:
+                WARMUP['errors'][name] = str(e)
+                log_event(startup_log, 'warmup_failed', level=logging.ERROR, step=name, error=str(e),
+                          attempt=WARMUP['attempts'], retry_in=delay)
+        if all(WARMUP['steps'].values()):
+            break
+        socketio.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX)
+    WARMUP['completed_at'] = datetime.now().isoformat()
 
 # 🧠 Step 1: Interpret Message and Find Customer by Email or Phone
 def find_customer(identifier):
-    for customer in customers:
-        if customer['email'] == identifier or customer['phone'] == identifier:
-            return customer
-    return None
+    return get_catalog().customers_by_contact.get(identifier)
 
 # 🧠 Step 2: Find Relevant Orders for a Customer
 def find_orders_by_userid(user_id):
-    return [order for order in orders if order['userid'] == user_id]
+    return get_catalog().orders_by_user.get(user_id, [])
+
+def resolve_order(message, user_id):
+    """Pick the order a message is about; see Catalog.resolve_order."""
+    return get_catalog().resolve_order(message, user_id)
+
+def summarize_recent_orders(user_id, limit=3):
+    """One compact line per recent order (newest first) for the AI prompt."""
+    catalog = get_catalog()
+    lines = []
+    for order in reversed(find_orders_by_userid(user_id)[-limit:]):
+        product = catalog.products_by_id.get(order['product'])
+        payment = catalog.payments_by_id.get(order['paymentid'])
+        lines.append(
+            f"- {order['order_id']}: {product['name'] if product else order['product']} x{order['quantity']}, "
+            f"status={order['status']}, delivered_on={order['delivered_on'] or 'n/a'}, "
+            f"payment={payment['status'] if payment else 'n/a'}"
+        )
+    return '\n'.join(lines)
 
 # 🧠 Step 3: Refund Eligibility Checker
-def can_refund(order):
+def refund_days_remaining(order):
+    """Days left in the refund window, or None if the order was never delivered."""
     if not order['delivered_on']:
-        return False
+        return None
     delivered_date = datetime.strptime(order['delivered_on'], "%Y-%m-%d")
     days_since_delivery = (datetime.now() - delivered_date).days
-    return days_since_delivery <= policy['refund_window_days']
+    return get_catalog().refund_window(order) - days_since_delivery
+
+def can_refund(order):
+    remaining = refund_days_remaining(order)
+    return remaining is not None and remaining >= 0
 
 # 🧠 Step 4: Detect Simple Greetings
 def is_greeting(message):
@@ -95,12 +475,13 @@ def is_greeting(message):
         return False
     return any(re.search(pattern, message) for pattern in greetings)
 
-def needs_escalation_or_clarification(message, customer, order=None):
+def needs_escalation_or_clarification(message, customer, order=None, prior_turns=0, repeat_count=0):
     message = message.lower().strip()
     
-    # Check for incomplete information (e.g., vague or missing details)
+    # Check for incomplete information (e.g., vague or missing details).
+    # Follow-ups in an ongoing conversation already have context.
     vague_phrases = ['help', 'issue', 'problem', 'something wrong', 'not working', 'trouble with', 'difficulties']
-    if any(phrase in message for phrase in vague_phrases) and len(message.split()) < 10:
+    if prior_turns == 0 and any(phrase in message for phrase in vague_phrases) and len(message.split()) < 10:
         return {'needs_clarification': True, 'is_escalating': False}
     
     # EXPANDED: Check for complex queries that exceed AI capability
@@ -152,11 +533,13 @@ def needs_escalation_or_clarification(message, customer, order=None):
         return {'needs_clarification': False, 'is_escalating': True}
     
     # If message is too short or lacks context
-    if len(message.split()) < 3 and not is_greeting(message):
+    if prior_turns == 0 and len(message.split()) < 3 and not is_greeting(message):
         return {'needs_clarification': True, 'is_escalating': False}
     
-    # ADDED: Check for repeated contacts about the same issue
-    # In a real system, you would check customer contact history
+    # ADDED: Check for repeated contacts about the same issue, both from the
+    # conversation memory and from what the customer tells us
+    if repeat_count >= REPEAT_ESCALATION_THRESHOLD:
+        return {'needs_clarification': False, 'is_escalating': True}
     repeated_issues = ['again', 'still not resolved', 'second time', 'already contacted',
                       'previously reported', 'still waiting', 'no response']
     if any(phrase in message for phrase in repeated_issues):
@@ -164,6 +547,90 @@ def needs_escalation_or_clarification(message, customer, order=None):
     
     return {'needs_clarification': False, 'is_escalating': False}
 
+# ⚡ Step 5: Fast-path intents answered from order/payment data without the LLM
+FAST_PATH_INTENTS = [
+    ('payment_failed', [
+        r'\bpayment\b.*\b(fail(ed|ing)?|declined|didn\'?t go through|not go(ne)? through|unsuccessful)\b',
+        r'\b(fail(ed)?|declined)\b.*\bpayment\b',
+        r'\b(was|did|has) my payment\b',
+        r'\bpayment status\b',
+    ]),
+    ('refund_eligibility', [
+        r'\b(can|could|may) i (get|have|request|ask for) (a |my )?(refund|money back)\b',
+        r'\b(am i|is (it|my order)) (still )?eligible for (a )?refund\b',
+        r'\brefund (eligibility|window|policy)\b',
+        r'\bhow (many|much) (days|time) .*refund\b',
+    ]),
+    ('order_status', [
+        r'\bwhere(\'s| is) my (order|package|item|parcel)\b',
+        r'\b(order|delivery) status\b',
+        r'\bstatus of my (order|delivery|package)\b',
+        r'\btrack(ing)? my (order|package|delivery)\b',
+        r'\bwhen (will|is) my (order|package|item|parcel)\b',
+        r'\bhas my (order|package|item|parcel) (shipped|arrived|been delivered)\b',
+    ]),
+]
+FAST_PATH_PATTERNS = [
+    (intent, [re.compile(p) for p in patterns]) for intent, patterns in FAST_PATH_INTENTS
+]
+
+# Counters for /support/metrics: how many replies skipped the LLM
+FAST_PATH_STATS = {
+    'answered': {intent: 0 for intent, _ in FAST_PATH_INTENTS},
+    'llm_calls': 0,
+}
+
+def detect_intent(message):
+    """Return the first high-frequency intent matched by the message, or None."""
+    message = message.lower().strip()
+    for intent, patterns in FAST_PATH_PATTERNS:
+        if any(p.search(message) for p in patterns):
+            return intent
+    return None
+
+def answer_fast_path(intent, customer, order, payment=None, product=None):
+    """
+    Build a templated answer for a detected intent.
+    Returns None when the data can't answer it confidently, so the caller
+    falls through to the LLM.
+    """
+    item = product['name'] if product else 'your item'
+
+    if intent == 'order_status':
+        txt = f"Hi {customer['name']}, your order {order['order_id']} ({item}) is currently ***{order['status']}***."
+        if order['delivered_on']:
+            txt += f" It was delivered on **{order['delivered_on']}**."
+        elif not order['paid']:
+            txt += " We haven't received payment for it yet, so it won't ship until payment is completed."
+        return txt
+
+    if intent == 'payment_failed':
+        if not payment:
+            return None
+        if payment['status'] == 'failed':
+            return (f"Hi {customer['name']}, your payment {payment['paymentid']} for order {order['order_id']} "
+                    f"via {payment['method']} ***failed***. No money was taken for this attempt. "
+                    "Please retry the payment from your orders page or use a different card.")
+        if payment['status'] == 'success':
+            return (f"Hi {customer['name']}, good news: your payment {payment['paymentid']} for order "
+                    f"{order['order_id']} was ***successful***. Your order status is **{order['status']}**.")
+        return None
+
+    if intent == 'refund_eligibility':
+        remaining = refund_days_remaining(order)
+        window = get_catalog().refund_window(order)
+        if remaining is None:
+            return (f"Hi {customer['name']}, your order {order['order_id']} ({item}) hasn't been delivered yet, "
+                    "so it isn't eligible for a refund. Refunds open once the order is delivered.")
+        if remaining >= 0:
+            days = 'day' if remaining == 1 else 'days'
+            return (f"Hi {customer['name']}, your order {order['order_id']} ({item}) is ***eligible for a refund***. "
+                    f"You have **{remaining} {days}** left in the {window}-day refund window.")
+        return (f"Hi {customer['name']}, unfortunately your order {order['order_id']} ({item}) is outside the "
+                f"{window}-day refund window, so it is ***no longer eligible for a refund***.")
+
+    return None
+
 # 📝 Format AI Response for better display
 def format_ai_response(text):
     """
@@ -224,7 +691,8 @@ def format_ai_response(text):
     return ''.join(formatted_lines)
 
 # 🤖 AI Layer: Compose AI Response with full customer/order context
-def generate_ai_response(customer, message, order=None, payment=None, product=None):
+def generate_ai_response(customer, message, order=None, payment=None, product=None, recent_orders=None,
+                         history=None):
     try:
         prompt = f"""
 You are a helpful and professional customer support assistant for the ShopNex e-commerce platform.
@@ -235,6 +703,9 @@ Email: {customer['email']}
 Phone: {customer['phone']}
 Address: {customer['address']}
 
+Conversation So Far:
+{history or "This is the first message in the conversation"}
+
 Support Message: {message}
 
 Order Info:
@@ -246,8 +717,11 @@ Payment Info:
 Product Info:
 {json.dumps(product, indent=2) if product else "No product information available"}
 
+Other Recent Orders:
+{recent_orders or "None"}
+
 Support Policy:
-{json.dumps(policy, indent=2)}
+{json.dumps(get_catalog().policy, indent=2)}
 
 Respond kindly, clearly, and informatively to the customer's concern.
 Use markdown formatting for emphasis:
@@ -258,12 +732,14 @@ Use markdown formatting for emphasis:
 Always refer to the platform as "ShopNex".
 """
 
-        response = client.models.generate_content(
-            model="gemini-2.0-flash", contents=prompt)
+        with span('llm'):
+            response = get_llm_client().models.generate_content(
+                model="gemini-2.0-flash", contents=prompt)
         
         # Get the raw text and format it
         raw_text = response.text.strip()
-        formatted_text = format_ai_response(raw_text)
+        with span('format'):
+            formatted_text = format_ai_response(raw_text)
         
         return {
             'raw': raw_text,
@@ -276,7 +752,37 @@ Always refer to the platform as "ShopNex".
             'formatted': f'<div>{html.escape(error_message)}</div>'
         }
 
-@app.route('/health', methods=['GET'])
+@api.before_app_request
+def assign_request_id():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+@api.after_app_request
+def echo_request_id(response):
+    if g.get('request_id'):
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@api.before_app_request
+def start_profile():
+    reason = profiler.reason(requested=request.headers.get('X-Profile') == '1' and is_staff_request())
+    if reason:
+        profiler.start(f'{request.method} {request.path}', reason, request_id=g.request_id)
+
+@api.after_app_request
+def record_profile_status(response):
+    capture = current_capture()
+    if capture:
+        capture.fields['status'] = response.status_code
+    return response
+
+@api.teardown_app_request
+def finish_profile(exc):
+    # Teardown runs even when the view raised, so the cProfile slot is always released
+    capture = current_capture()
+    if capture:
+        profiler.finish(capture, error=repr(exc) if exc else None)
+
+@api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint to verify the API is running."""
     return jsonify({
@@ -284,13 +790,134 @@ def health_check():
         "timestamp": datetime.now().isoformat()
     }), 200
 
-@app.route('/support', methods=['POST'])
+@api.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint: 200 only once warm-up (indexes, LLM client, DB) has completed."""
+    ready = WARMUP['skipped'] or (WARMUP['completed_at'] is not None and all(WARMUP['steps'].values()))
+    return jsonify({
+        'status': 'ready' if ready else 'warming_up',
+        **WARMUP
+    }), 200 if ready else 503
+
+@api.route('/support/metrics', methods=['GET'])
+def support_metrics():
+    """Fast-path hit rate: how many /support replies avoided an LLM call."""
+    answered = sum(FAST_PATH_STATS['answered'].values())
+    total = answered + FAST_PATH_STATS['llm_calls']
+    return jsonify({
+        'fast_path': dict(FAST_PATH_STATS['answered']),
+        'fast_path_total': answered,
+        'llm_calls': FAST_PATH_STATS['llm_calls'],
+        'hit_rate': round(answered / total, 4) if total else 0.0,
+        'conversations': conversation_memory.stats(),
+        'profiles': profile_cache.stats(),
+        'rate_limits': rate_limiter.stats(),
+        'jobs': JOB_STATS,
+        'logs': log_stats()
+    }), 200
+
+@api.route('/support/queue', methods=['GET'])
+@staff_only
+def queue_status():
+    """Live queue/SLA numbers: waiting, wait avg/p50/p95, agents available/busy, resolved in the last hour."""
+    return jsonify(queue_snapshot()), 200
+
+@api.route('/reports/refunds', methods=['GET'])
+@staff_only
+def refund_report():
+    """Refund eligibility and days remaining for every order, evaluated in bulk."""
+    eligible_only = request.args.get('eligible_only', '').lower() in ('1', 'true', 'yes')
+    rows = get_catalog().refund_table.report(eligible_only=eligible_only)
+    return jsonify({
+        'generated_at': datetime.now().isoformat(),
+        'count': len(rows),
+        'orders': rows
+    }), 200
+
+def search_transcripts(params):
+    """Shared by the HTTP and Socket.IO search APIs; params is a dict-like of filters."""
+    try:
+        limit = min(int(params.get('limit') or 20), 100)
+        offset = max(int(params.get('offset') or 0), 0)
+    except (TypeError, ValueError):
+        limit, offset = 20, 0
+    began = time.perf_counter()
+    results = transcript_index.search(
+        params.get('q') or '',
+        customer_id=params.get('customer_id'),
+        case_number=params.get('case_number'),
+        state=params.get('state'),
+        since=params.get('since'),
+        until=params.get('until'),
+        limit=limit,
+        offset=offset
+    )
+    return {
+        'query': params.get('q') or '',
+        'results': results,
+        'took_ms': round((time.perf_counter() - began) * 1000, 2)
+    }
+
+@api.route('/transcripts/search', methods=['GET'])
+@staff_only
+def transcript_search():
+    """Full-text search over chat transcripts, filtered by customer, case number, state and date."""
+    return jsonify(search_transcripts(request.args)), 200
+
+@api.route('/admin/archive', methods=['GET'])
+@staff_only
+def archive_status():
+    """Totals for the chat archive, including bytes saved by compression."""
+    ensure_schema()
+    return jsonify(archive_report(get_db())), 200
+
+@api.route('/admin/archive', methods=['POST'])
+@staff_only
+def archive_now():
+    """Run one archival pass immediately (optionally limited with ?max_batches=N)."""
+    max_batches = request.args.get('max_batches', type=int)
+    run = archive_resolved_chats(max_batches=max_batches)
+    return jsonify({'run': run, 'totals': archive_report(get_db())}), 200
+
+@api.route('/admin/profiles', methods=['GET'])
+@staff_only
+def slow_request_profiles():
+    """Slowest profiled requests with span breakdowns; ?profile=1 adds the cProfile output."""
+    include_profile = request.args.get('profile', '').lower() in ('1', 'true', 'yes')
+    return jsonify({**profiler.stats(), 'captures': profiler.captures(include_profile)}), 200
+
+@api.route('/admin/profiles', methods=['DELETE'])
+@staff_only
+def clear_request_profiles():
+    profiler.clear()
+    return jsonify(profiler.stats()), 200
+
+@api.route('/admin/jobs', methods=['GET'])
+@staff_only
+def job_status():
+    """Background job counts by status, plus this process's worker counters."""
+    ensure_schema()
+    return jsonify({'queue': queue_stats(get_db()), 'worker': JOB_STATS}), 200
+
+@api.route('/support', methods=['POST'])
 def support():
     try:
         data = request.get_json()
         identifier = data.get('identifier')
         message    = data.get('message', '')
 
+        allowed, retry_after, key = rate_limiter.check('support', ip=client_ip(), identifier=identifier)
+        if not allowed:
+            log_event(support_log, 'rate_limited', level=logging.DEBUG, key=key)
+            txt = "You're sending messages too quickly. Please wait a moment and try again."
+            response = jsonify({
+                'ai_response': {'raw': txt, 'formatted': f"<div>{txt}</div>"},
+                'is_escalating': False,
+                'retry_after': retry_after
+            })
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response, 429
+
         customer = find_customer(identifier)
         if not customer:
             return jsonify({
@@ -309,17 +936,38 @@ def support():
                 'is_escalating': False
             })
 
-        last_order = customer_orders[-1]
-        payment    = next((p for p in payments if p['paymentid']==last_order['paymentid']), None)
-        product    = next((p for p in products if p['product_id']==last_order['product']), None)
+        # Conversation memory is namespaced by customer so session IDs can't leak across accounts
+        session_key = f"{customer['user_id']}:{data.get('session_id') or identifier}"
+        session     = conversation_memory.get(session_key)
+        history     = conversation_memory.render(session_key)
+        prior_turns = session.customer_turns()
+        conversation_memory.add_turn(session_key, 'customer', message)
+
+        last_order, explicit = resolve_order(message, customer['user_id'])
+        if explicit:
+            session.order_id = last_order['order_id']
+        elif session.order_id in get_catalog().orders_by_id:
+            # Follow-ups stay on the order discussed earlier in the session
+            last_order = get_catalog().orders_by_id[session.order_id]
+        payment    = get_catalog().payments_by_id.get(last_order['paymentid'])
+        product    = get_catalog().products_by_id.get(last_order['product'])
 
         if is_greeting(message):
             txt = f"Hi {customer['name']}! Thanks for reaching out. How can I assist you today?"
+            conversation_memory.add_turn(session_key, 'assistant', txt)
             return jsonify({'ai_response':{'raw':txt,'formatted':f"<div>{txt}</div>"}, 'is_escalating':False})
 
-        esc = needs_escalation_or_clarification(message, customer, last_order)
+        intent = detect_intent(message)
+        repeat_count = 0
+        if intent:
+            repeat_count = session.intents.get(intent, 0) + 1
+            session.intents[intent] = repeat_count
+
+        esc = needs_escalation_or_clarification(message, customer, last_order,
+                                                prior_turns=prior_turns, repeat_count=repeat_count)
         if esc['needs_clarification']:
             txt = f"Hi {customer['name']}, could you please provide more details about your issue?"
+            conversation_memory.add_turn(session_key, 'assistant', txt)
             return jsonify({'ai_response':{'raw':txt,'formatted':f"<div>{txt}</div>"}, 'is_escalating':False})
 
         if esc['is_escalating']:
@@ -328,17 +976,20 @@ def support():
             case_number = f"CASE-{datetime.now():%Y%m%d%H%M%S}"
             
             # Create new chat entry
+            first_message = {
+                'from': 'customer',
+                'text': message,
+                'timestamp': datetime.now().isoformat()
+            }
             cur.execute(
                 "INSERT INTO chats (id, customer_id, customer_name, customer_email, state, case_number, created_at, messages, issue) "
                 "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
                 (chat_id, customer['user_id'], customer['name'], identifier, CHAT_STATES['WAITING'], 
-                 case_number, datetime.now(), json.dumps([{
-                    'from': 'customer',
-                    'text': message,
-                    'timestamp': datetime.now().isoformat()
-                }]), message[:100])
+                 case_number, datetime.now(), json.dumps([first_message]), message[:100])
             )
             mysql.connection.commit()
+            index_transcript('add_chat', chat_id, customer['user_id'], customer['name'], case_number,
+                             CHAT_STATES['WAITING'], first_message['timestamp'], [first_message])
 
             # Notify all connected agents about the new escalation
             socketio.emit(WS_EVENTS['NEW_ESCALATION'], {
@@ -348,7 +999,8 @@ def support():
                 'customer_name': customer['name'],
                 'timestamp': datetime.now().isoformat(),
                 'issue': message[:100],
-                'priority': 'medium'  # Default priority, could be based on customer type
+                'priority': 'medium',  # Default priority, could be based on customer type
+                'customer_profile': profile_cache.get(customer['user_id'])
             })
             
             # Also emit with the frontend-expected event name
@@ -356,13 +1008,7 @@ def support():
                 'id': chat_id,
                 'caseNumber': case_number,
                 'customerName': customer['name'],
-                'customerDetails': {
-                    'name': customer['name'],
-                    'email': customer['email'],
-                    'phone': customer['phone'],
-                    'type': 'regular',  # You might want to determine this based on customer data
-                    'memberSince': '2023-01-01'  # Placeholder, replace with actual data
-                },
+                'customerDetails': customer_details(customer['user_id']),
                 'issue': message[:100],
                 'messages': [{
                     'id': str(uuid.uuid4()),
@@ -374,6 +1020,13 @@ def support():
                 'priority': 'medium'  # Default priority
             })
 
+            # The agent takes it from here
+            conversation_memory.drop(session_key)
+            log_event(support_log, 'escalated', chat_id=chat_id, case_number=case_number,
+                      user_id=customer['user_id'])
+            touch_chat(chat_id, CHAT_STATES['WAITING'])
+            sla_stats.chat_waiting(chat_id)
+            route_waiting_chats()
             return jsonify({
                 'ai_response': {
                     'raw': "We're connecting you to an agent. Please wait...",
@@ -384,24 +1037,58 @@ def support():
                 'case_number': case_number
             })
 
-        # Otherwise, let the AI reply
+        # Answer common order/payment/refund questions straight from the data
+        if intent:
+            txt = answer_fast_path(intent, customer, last_order, payment=payment, product=product)
+            if txt:
+                FAST_PATH_STATS['answered'][intent] += 1
+                log_event(support_log, 'fast_path', level=logging.DEBUG, intent=intent,
+                          order_id=last_order['order_id'])
+                conversation_memory.add_turn(session_key, 'assistant', txt)
+                with span('format'):
+                    formatted = format_ai_response(txt)
+                return jsonify({
+                    'ai_response': {'raw': txt, 'formatted': formatted},
+                    'is_escalating': False,
+                    'intent': intent
+                })
+
+        # Otherwise, let the AI reply. If the message didn't name an order,
+        # give the model the other recent orders so it can disambiguate.
+        recent_orders = None
+        if not explicit and len(customer_orders) > 1:
+            recent_orders = summarize_recent_orders(customer['user_id'])
+        FAST_PATH_STATS['llm_calls'] += 1
         ai_response = generate_ai_response(customer, message, order=last_order,
-                                           payment=payment, product=product)
+                                           payment=payment, product=product,
+                                           recent_orders=recent_orders, history=history)
+        conversation_memory.add_turn(session_key, 'assistant', ai_response['raw'])
         return jsonify({'ai_response': ai_response, 'is_escalating': False})
 
     except Exception as e:
-        print(e)
+        log_event(support_log, 'support_error', level=logging.ERROR, exc_info=e)
         err = "Sorry, something went wrong while processing your request."
         return jsonify({'ai_response':{'raw':err,'formatted':f"<div>{err}</div>"}, 'is_escalating':False})
 
 @socketio.on('connect')
-def handle_connect():
-    print('Client connected:', request.sid)
+def handle_connect(auth=None):
+    protocol = wire.requested_protocol(auth, request.args)
+    log_event(socket_log, 'connect', protocol=protocol)
+    if protocol == wire.COMPACT:
+        client_protocols[request.sid] = protocol
+        emit('protocol', {'version': protocol, 'compact_events': list(wire.COMPACT_EVENTS)})
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print('Client disconnected:', request.sid)
-    # Mark agent as offline if they disconnect
+    log_event(socket_log, 'disconnect')
+    client_protocols.pop(request.sid, None)
+    # Stop routing to this agent and mark them offline. Their chats stay put
+    # for AGENT_RECONNECT_GRACE: an agent who logs in again (new sid, same
+    # email) before then takes them back (reclaim_chats), otherwise the
+    # sweeper requeues them
+    if request.sid in agent_pool.agents:
+        agent_pool.set_available(request.sid, False)
+        watch_agent(request.sid, AGENT_RECONNECT_GRACE)
     cur = get_db()
     cur.execute(
         "UPDATE agents SET online = false WHERE id = %s",
@@ -410,9 +1097,12 @@ def handle_disconnect():
     mysql.connection.commit()
 
 @socketio.on('agent_login')
+@profiled('agent_login')
 def handle_agent_login(data):
     agent_id = request.sid
-    print(f"Agent logged in: {data['name']} ({agent_id})")
+    log_event(agent_log, 'agent_login', agent_id=agent_id, agent_name=data['name'])
+    slot = agent_pool.register(agent_id, data['name'], capacity=data.get('capacity'))
+    watch_agent(agent_id)
     
     # Store WebSocket connection ID with agent
     cur = get_db()
@@ -429,8 +1119,10 @@ def handle_agent_login(data):
     emit('agent_status', {
         'status': 'online',
         'name': data['name'],
-        'email': data['email']
+        'email': data['email'],
+        'capacity': slot.capacity
     })
+    reclaim_chats(agent_id, data['email'])
     
     # Send list of waiting chats to the agent
     cur.execute(
@@ -447,156 +1139,519 @@ def handle_agent_login(data):
             'customer_name': chat['customer_name'],
             'timestamp': chat['created_at'].isoformat(),
             'issue': chat['issue'] if 'issue' in chat else 'Support request',
-            'priority': 'medium'  # Default priority
+            'priority': 'medium',  # Default priority
+            'customer_profile': profile_cache.get(chat['customer_id'])
         })
 
-@socketio.on('agent_available')
-def handle_agent_available():
-    print(f"Agent {request.sid} marked as available")
-    
-    # Update agent status
+def sync_agent_status(cur, agent_id):
+    """Mirror an agent's load into the agents table: busy only when at capacity."""
+    cur.execute(
+        "UPDATE agents SET current_chat = %s, status = %s WHERE id = %s",
+        (agent_pool.latest_chat(agent_id), 'busy' if agent_pool.is_full(agent_id) else 'available', agent_id)
+    )
+
+def emit_assigned_to_agent(chat, messages, agent_id, agent_name):
+    """Send an agent the chat card and transcript for a chat they now hold."""
+    chat_data = {
+        'id': chat['id'],
+        'chat_id': chat['id'],
+        'caseNumber': chat['case_number'],
+        'customerName': chat['customer_name'],
+        'customerDetails': customer_details(chat['customer_id'], chat['customer_name'], chat['customer_email']),
+        'issue': chat['issue'] if 'issue' in chat else 'Support request',
+        'messages': [
+            {
+                'id': f"msg_{i}",
+                'content': msg['text'],
+                'sender': 'user' if msg['from'] == 'customer' else msg['from'],
+                'timestamp': msg['timestamp']
+            } for i, msg in enumerate(messages)
+        ],
+        'timestamp': chat['created_at'].isoformat(),
+        'priority': 'medium',  # Default priority
+        'agent_id': agent_id,
+        'agent_name': agent_name
+    }
+    emit_chat_event(WS_EVENTS['CHAT_ASSIGNED'], agent_id, chat_data,
+                    wire.chat_assigned(chat, len(messages) - 1, chat_data['customerDetails'], agent_id, agent_name))
+
+def assign_chat(chat, agent_id):
+    """Hand a waiting chat to an agent and notify both sides. Returns False if someone else got it first."""
     cur = get_db()
     cur.execute(
-        "UPDATE agents SET status = 'available' WHERE id = %s",
-        (request.sid,)
+        "UPDATE chats SET state = %s, agent_id = %s "
+        "WHERE id = %s AND state = %s",
+        (CHAT_STATES['ASSIGNED'], agent_id, chat['id'], CHAT_STATES['WAITING'])
     )
+    if cur.rowcount == 0:
+        mysql.connection.commit()
+        return False
+    agent_pool.assign(agent_id, chat['id'])
+    sync_agent_status(cur, agent_id)
     mysql.connection.commit()
-    
-    # Find next waiting chat and assign
+    sla_stats.chat_assigned(chat['id'])
+    touch_chat(chat['id'], CHAT_STATES['ASSIGNED'])
+    index_transcript('set_state', chat['id'], CHAT_STATES['ASSIGNED'])
+
+    # Get messages
+    messages = json.loads(chat['messages']) if chat['messages'] else []
+    agent_name = agent_pool.agents[agent_id].name or 'Agent'
+
+    # Notify the agent about the assigned chat, with replies that worked for similar chats
+    emit_assigned_to_agent(chat, messages, agent_id, agent_name)
+    customer_text = ' '.join(m['text'] for m in messages if m['from'] == 'customer')
+    push_suggestions(agent_id, chat['id'], customer_text or chat.get('issue'))
+
+    # Add a system message about agent assignment
+    system_message = {
+        'from': 'system',
+        'text': f"You've been connected to {agent_name}",
+        'timestamp': datetime.now().isoformat()
+    }
+    messages.append(system_message)
+
     cur.execute(
-        "SELECT * FROM chats WHERE state = %s ORDER BY created_at LIMIT 1",
-        (CHAT_STATES['WAITING'],)
+        "UPDATE chats SET messages = %s WHERE id = %s",
+        (json.dumps(messages), chat['id'])
     )
+    mysql.connection.commit()
+
+    # Also emit with the expected customer-side event name
+    emit_chat_event(WS_EVENTS['CHAT_ASSIGNED'], chat['customer_id'], {
+        'chat_id': chat['id'],
+        'message': system_message['text']
+    }, wire.notice(chat['id'], system_message['text'], s=len(messages) - 1))
+
+    log_event(chat_log, 'chat_assigned', chat_id=chat['id'], agent_id=agent_id,
+              load=agent_pool.agents[agent_id].load)
+    return True
+
+def route_waiting_chats():
+    """Assign waiting chats, oldest first, to the least-loaded agents with free capacity."""
+    cur = get_db()
+    while True:
+        slot = agent_pool.pick_agent()
+        if slot is None:
+            return
+        cur.execute(
+            "SELECT * FROM chats WHERE state = %s ORDER BY created_at LIMIT 1",
+            (CHAT_STATES['WAITING'],)
+        )
+        chat = cur.fetchone()
+        if not chat:
+            log_event(chat_log, 'no_waiting_chats', level=logging.DEBUG)
+            return
+        assign_chat(chat, slot.agent_id)
+
+# 🧹 Sweeper: times out abandoned waits, idle chats and vanished agents
+def touch_chat(chat_id, state=None):
+    """Re-arm a chat's inactivity timer (O(1)); call on every message or state change."""
+    timeout = CHAT_WAITING_TIMEOUT if state == CHAT_STATES['WAITING'] else CHAT_IDLE_TIMEOUT
+    sweeper_timers.schedule(('chat', chat_id), timeout)
+
+def watch_agent(agent_id, delay=None):
+    sweeper_timers.schedule(('agent', agent_id), delay or AGENT_CHECK_INTERVAL)
+
+def agent_connected(agent_id):
+    return bool(agent_id) and socketio.server.manager.is_connected(agent_id, '/')
+
+def close_chat(chat_id, customer_id, agent_id, reason):
+    cur = get_db()
+    cur.execute(
+        "UPDATE chats SET state = %s, resolved_at = %s WHERE id = %s AND state <> %s",
+        (CHAT_STATES['RESOLVED'], datetime.now(), chat_id, CHAT_STATES['RESOLVED'])
+    )
+    if cur.rowcount:
+        sla_stats.chat_resolved(chat_id, auto=True)
+    if agent_id:
+        agent_pool.release(chat_id)
+        sync_agent_status(cur, agent_id)
+    mysql.connection.commit()
+    sweeper_timers.cancel(('chat', chat_id))
+    index_transcript('set_state', chat_id, CHAT_STATES['RESOLVED'])
+    payload = {'chat_id': chat_id, 'message': reason, 'auto': True}
+    compact = wire.notice(chat_id, reason, auto=True)
+    emit_chat_event(WS_EVENTS['CHAT_RESOLVED'], customer_id, payload, compact)
+    if agent_id:
+        emit_chat_event(WS_EVENTS['CHAT_RESOLVED'], agent_id, payload, compact)
+
+def requeue_chat(chat):
+    """Put an assigned chat back in the waiting queue (its agent disappeared)."""
+    cur = get_db()
+    cur.execute(
+        "UPDATE chats SET state = %s, agent_id = NULL WHERE id = %s AND state = %s",
+        (CHAT_STATES['WAITING'], chat['id'], CHAT_STATES['ASSIGNED'])
+    )
+    mysql.connection.commit()
+    if cur.rowcount == 0:
+        return
+    agent_pool.release(chat['id'])
+    touch_chat(chat['id'], CHAT_STATES['WAITING'])
+    index_transcript('set_state', chat['id'], CHAT_STATES['WAITING'])
+    sla_stats.chat_waiting(chat['id'], new=False)
+    SWEEPER_STATS['requeued'] += 1
+    log_event(chat_log, 'chat_requeued', chat_id=chat['id'], agent_id=chat['agent_id'])
+    socketio.emit('agent_transferred', {
+        'chat_id': chat['id'],
+        'message': 'Your agent was disconnected. Connecting you to another agent...'
+    }, room=chat['customer_id'])
+    socketio.emit(WS_EVENTS['NEW_ESCALATION'], {
+        'chat_id': chat['id'],
+        'case_number': chat['case_number'],
+        'customer_id': chat['customer_id'],
+        'customer_name': chat['customer_name'],
+        'timestamp': chat['created_at'].isoformat(),
+        'issue': chat['issue'] if 'issue' in chat else 'Support request',
+        'priority': 'medium',
+        'customer_profile': profile_cache.get(chat['customer_id'])
+    })
+
+def on_chat_timeout(chat_id):
+    cur = get_db()
+    cur.execute("SELECT * FROM chats WHERE id = %s", (chat_id,))
     chat = cur.fetchone()
-    
-    if chat:
-        # Get messages
-        messages = json.loads(chat['messages']) if chat['messages'] else []
-        
-        # Update chat state
+    if not chat:
+        return
+    action = chat_timeout_action(chat['state'], agent_connected(chat['agent_id']))
+    if action == EXPIRE:
+        close_chat(chat_id, chat['customer_id'], None,
+                   'This chat was closed because no agent picked it up in time. Please reach out again if you still need help.')
+        SWEEPER_STATS['expired'] += 1
+        log_event(chat_log, 'chat_expired', chat_id=chat_id)
+    elif action == REQUEUE:
+        requeue_chat(chat)
+    elif action == AUTO_RESOLVE:
+        close_chat(chat_id, chat['customer_id'], chat['agent_id'],
+                   'This chat was closed after a period of inactivity')
+        SWEEPER_STATS['auto_resolved'] += 1
+        log_event(chat_log, 'chat_auto_resolved', chat_id=chat_id, agent_id=chat['agent_id'])
+
+def on_agent_check(agent_id):
+    if agent_connected(agent_id):
+        watch_agent(agent_id)
+        return
+    # The socket is gone (possibly without a clean disconnect): take the agent
+    # out of routing and hand their chats to someone else
+    agent_pool.unregister(agent_id)
+    cur = get_db()
+    cur.execute(
+        "UPDATE agents SET online = false, status = 'available', current_chat = NULL WHERE id = %s",
+        (agent_id,)
+    )
+    cur.execute(
+        "SELECT * FROM chats WHERE agent_id = %s AND state = %s",
+        (agent_id, CHAT_STATES['ASSIGNED'])
+    )
+    stranded = cur.fetchall()
+    mysql.connection.commit()
+    SWEEPER_STATS['agents_dropped'] += 1
+    log_event(agent_log, 'agent_dropped', agent_id=agent_id, stranded_chats=len(stranded))
+    for chat in stranded:
+        requeue_chat(chat)
+
+def reclaim_chats(agent_id, email):
+    """
+    Hand an agent back the chats of their previous connection (same email) if it
+    dropped less than AGENT_RECONNECT_GRACE ago. A reconnect always gets a new
+    sid, so without this the sweeper would requeue them.
+    """
+    cur = get_db()
+    cur.execute(
+        "SELECT id FROM agents WHERE email = %s AND id <> %s AND online = false",
+        (email, agent_id)
+    )
+    # Still in the pool with its check pending: disconnected, grace not yet over
+    previous = [row['id'] for row in cur.fetchall()
+                if row['id'] in agent_pool.agents and ('agent', row['id']) in sweeper_timers
+                and not agent_connected(row['id'])]
+    reclaimed = []
+    for old_id in previous:
+        sweeper_timers.cancel(('agent', old_id))
         cur.execute(
-            "UPDATE chats SET state = %s, agent_id = %s "
-            "WHERE id = %s",
-            (CHAT_STATES['ASSIGNED'], request.sid, chat['id'])
+            "SELECT * FROM chats WHERE agent_id = %s AND state = %s",
+            (old_id, CHAT_STATES['ASSIGNED'])
         )
+        chats = cur.fetchall()
         cur.execute(
-            "UPDATE agents SET current_chat = %s, status = 'busy' WHERE id = %s",
-            (chat['id'], request.sid)
+            "UPDATE chats SET agent_id = %s WHERE agent_id = %s AND state = %s",
+            (agent_id, old_id, CHAT_STATES['ASSIGNED'])
         )
-        mysql.connection.commit()
-        
-        # Get agent info
-        cur.execute("SELECT name, email FROM agents WHERE id = %s", (request.sid,))
-        agent = cur.fetchone()
-        
-        # Prepare chat data for frontend
-        chat_data = {
-            'id': chat['id'],
-            'chat_id': chat['id'],
-            'caseNumber': chat['case_number'],
-            'customerName': chat['customer_name'],
-            'customerDetails': {
-                'name': chat['customer_name'],
-                'email': chat['customer_email'],
-                'type': 'regular',  # This should be determined from customer data
-                'memberSince': '2023-01-01'  # Placeholder
-            },
-            'issue': chat['issue'] if 'issue' in chat else 'Support request',
-            'messages': [
-                {
-                    'id': f"msg_{i}",
-                    'content': msg['text'],
-                    'sender': 'user' if msg['from'] == 'customer' else msg['from'],
-                    'timestamp': msg['timestamp']
-                } for i, msg in enumerate(messages)
-            ],
-            'timestamp': chat['created_at'].isoformat(),
-            'priority': 'medium',  # Default priority
-            'agent_id': request.sid,
-            'agent_name': agent['name'] if agent else 'Agent'
-        }
-        
-        # Notify the agent about the assigned chat
-        emit(WS_EVENTS['CHAT_ASSIGNED'], chat_data)
-        
-        # Add a system message about agent assignment
-        system_message = {
-            'from': 'system',
-            'text': f"You've been connected to {agent['name'] if agent else 'an agent'}",
-            'timestamp': datetime.now().isoformat()
-        }
-        messages.append(system_message)
-        
         cur.execute(
-            "UPDATE chats SET messages = %s WHERE id = %s",
-            (json.dumps(messages), chat['id'])
+            "UPDATE agents SET status = 'available', current_chat = NULL WHERE id = %s",
+            (old_id,)
         )
-        mysql.connection.commit()
-        
-        # Also emit with the expected customer-side event name
-        socketio.emit(WS_EVENTS['CHAT_ASSIGNED'], {
-            'chat_id': chat['id'],
-            'message': f"You've been connected to {agent['name'] if agent else 'an agent'}"
-        }, room=chat['customer_id'])
-        
-        print(f"Chat {chat['id']} assigned to agent {request.sid}")
-    else:
-        print("No waiting chats found")
+        agent_pool.unregister(old_id)
+        # Their own chats, so this may go over the new connection's capacity
+        for chat in chats:
+            agent_pool.assign(agent_id, chat['id'])
+        reclaimed.extend(chats)
+    if not previous:
+        return reclaimed
+    sync_agent_status(cur, agent_id)
+    mysql.connection.commit()
+    agent_name = agent_pool.agents[agent_id].name or 'Agent'
+    for chat in reclaimed:
+        touch_chat(chat['id'], CHAT_STATES['ASSIGNED'])
+        emit_assigned_to_agent(chat, json.loads(chat['messages']) if chat['messages'] else [], agent_id, agent_name)
+    log_event(agent_log, 'agent_reconnected', agent_id=agent_id, previous=previous, reclaimed_chats=len(reclaimed))
+    return reclaimed
+
+def schedule_open_chats():
+    """Arm timers for chats left open by a previous process (their agents' sids are gone)."""
+    cur = get_db()
+    cur.execute(
+        "SELECT id, state FROM chats WHERE state IN (%s, %s)",
+        (CHAT_STATES['WAITING'], CHAT_STATES['ASSIGNED'])
+    )
+    for chat in cur.fetchall():
+        touch_chat(chat['id'], chat['state'])
+
+def run_sweeper(app):
+    with app.app_context():
+        try:
+            schedule_open_chats()
+        except Exception as e:
+            log_event(chat_log, 'sweeper_failed', level=logging.ERROR, exc_info=e)
+    while True:
+        socketio.sleep(sweeper_timers.tick)
+        expired = sweeper_timers.advance()
+        if not expired:
+            continue
+        with app.app_context():
+            for (kind, key), _ in expired:
+                try:
+                    if kind == 'chat':
+                        on_chat_timeout(key)
+                    else:
+                        on_agent_check(key)
+                except Exception as e:
+                    log_event(chat_log, 'sweeper_failed', level=logging.ERROR, exc_info=e, timer=kind, key=key)
+            # Requeued chats and freed slots may be routable now
+            route_waiting_chats()
+
+# 🗄️ Archiver: moves old resolved chats into compressed cold storage
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 30))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))
+ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', 3600))
+
+def archive_resolved_chats(max_batches=None):
+    """Archive in batches until nothing is left (or max_batches); returns what this run moved."""
+    ensure_schema()
+    cur = get_db()
+    cutoff = datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    summary = {'chats': 0, 'raw_bytes': 0, 'stored_bytes': 0, 'batches': 0}
+    while max_batches is None or summary['batches'] < max_batches:
+        moved, raw_bytes, stored_bytes = archive_batch(
+            cur, mysql.connection, cutoff, ARCHIVE_BATCH_SIZE, CHAT_STATES['RESOLVED'], datetime.now())
+        if not moved:
+            break
+        summary['batches'] += 1
+        summary['chats'] += moved
+        summary['raw_bytes'] += raw_bytes
+        summary['stored_bytes'] += stored_bytes
+        socketio.sleep(0)
+    summary['bytes_saved'] = summary['raw_bytes'] - summary['stored_bytes']
+    if summary['chats']:
+        log_event(chat_log, 'chats_archived', **summary)
+    return summary
+
+def run_archiver(app):
+    while True:
+        socketio.sleep(ARCHIVE_INTERVAL)
+        with app.app_context():
+            try:
+                archive_resolved_chats()
+            except Exception as e:
+                log_event(chat_log, 'archive_failed', level=logging.ERROR, exc_info=e)
+
+def queue_snapshot():
+    return sla_stats.snapshot(agent_pool.agents.values())
+
+def run_queue_stats_broadcast():
+    while True:
+        socketio.sleep(QUEUE_STATS_INTERVAL)
+        try:
+            socketio.emit(WS_EVENTS['QUEUE_STATS'], queue_snapshot(), room=SUPERVISORS_ROOM)
+        except Exception as e:
+            log_event(chat_log, 'queue_stats_failed', level=logging.ERROR, exc_info=e)
+
+# 📬 Background jobs: durable (MySQL `jobs` table), retried with backoff, run by worker green threads
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))                      # 0 disables the workers
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 5))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 600))        # running longer than this = worker died
+# Transcript emails are on by default once an SMTP server is configured
+TRANSCRIPT_EMAILS = os.getenv('TRANSCRIPT_EMAILS', '1' if os.getenv('MAIL_SERVER') else '0') != '0'
+JOB_STATS = {'enqueued': 0, 'done': 0, 'retried': 0, 'failed': 0}
+
+def enqueue_job(cur, kind, payload, **kwargs):
+    """Queue a job on the caller's cursor; it becomes visible to workers when the caller commits.
+    The jobs table must already exist (ensure_schema()), since DDL would commit the caller's transaction."""
+    job_id = enqueue(cur, kind, payload, datetime.now(), **kwargs)
+    JOB_STATS['enqueued'] += 1
+    return job_id
+
+@job_handler('transcript_email')
+def send_transcript_email(payload):
+    """Render the chat transcript to PDF and email it to the customer."""
+    chat_id = payload['chat_id']
+    cur = get_db()
+    cur.execute(
+        "SELECT id, customer_id, customer_name, case_number, created_at, resolved_at FROM chats WHERE id = %s",
+        (chat_id,)
+    )
+    chat = cur.fetchone()
+    # chats.customer_email holds whatever identifier the customer typed (often a phone number),
+    # so the address comes from the customer record
+    customer = get_catalog().customers_by_id.get(chat['customer_id']) if chat else None
+    email = customer.get('email') if customer else None
+    if not email:
+        log_event(job_log, 'transcript_email_skipped', chat_id=chat_id,
+                  reason='no_email' if chat else 'chat_not_found')
+        return
+    messages = load_messages(cur, chat_id) or []
+    # reportlab layout is CPU-bound: run it on a real OS thread so the event loop keeps serving
+    pdf = tpool.execute(render_transcript_pdf, chat, messages)
+    case_number = chat['case_number'] or chat_id
+    message = Message(
+        subject=f"Your support chat transcript (case {case_number})",
+        recipients=[email],
+        body=(f"Hi {chat['customer_name'] or 'there'},\n\n"
+              "Thanks for chatting with us. A transcript of your conversation is attached.\n")
+    )
+    message.attach(f"transcript-{case_number}.pdf", 'application/pdf', pdf)
+    mail.send(message)
+    log_event(job_log, 'transcript_emailed', chat_id=chat_id, pdf_bytes=len(pdf))
+
+def process_next_job(worker_id):
+    """Claim and run one due job; returns False when the queue had nothing to do."""
+    cur = get_db()
+    job = claim_next(cur, mysql.connection, worker_id, datetime.now())
+    if job is None:
+        return False
+    began = time.perf_counter()
+    try:
+        run_job(job)
+    except Exception as e:
+        mysql.connection.rollback()
+        status = fail(cur, mysql.connection, job, e, datetime.now())
+        JOB_STATS['failed' if status == JOB_STATES['FAILED'] else 'retried'] += 1
+        log_event(job_log, 'job_failed', level=logging.ERROR if status == JOB_STATES['FAILED'] else logging.WARNING,
+                  exc_info=e, job_id=job['id'], kind=job['kind'], attempts=job['attempts'], status=status)
+        return True
+    complete(cur, mysql.connection, job, datetime.now())
+    JOB_STATS['done'] += 1
+    log_event(job_log, 'job_done', job_id=job['id'], kind=job['kind'], attempts=job['attempts'],
+              duration_ms=round((time.perf_counter() - began) * 1000, 1))
+    return True
+
+def run_job_worker(app, worker_id):
+    last_requeue = None
+    while True:
+        busy = False
+        with app.app_context():
+            try:
+                ensure_schema()
+                # Jobs held by a worker that died are given back once their lease runs out;
+                # checking every half lease bounds how long they stay stuck
+                if last_requeue is None or time.monotonic() - last_requeue >= JOB_LEASE_SECONDS / 2:
+                    last_requeue = time.monotonic()
+                    requeued = requeue_stale(get_db(), mysql.connection, JOB_LEASE_SECONDS, datetime.now())
+                    if requeued:
+                        log_event(job_log, 'jobs_requeued', worker_id=worker_id, count=requeued)
+                busy = process_next_job(worker_id)
+            except Exception as e:
+                log_event(job_log, 'job_worker_failed', level=logging.ERROR, exc_info=e, worker_id=worker_id)
+        # Drain back-to-back while there is work, otherwise poll
+        socketio.sleep(0 if busy else JOB_POLL_INTERVAL)
+
+@socketio.on('agent_available')
+def handle_agent_available():
+    log_event(agent_log, 'agent_available', agent_id=request.sid)
+    
+    # Update agent status
+    agent_pool.set_available(request.sid)
+    cur = get_db()
+    sync_agent_status(cur, request.sid)
+    mysql.connection.commit()
+    
+    # Fill this agent's (and anyone else's) free slots from the queue
+    route_waiting_chats()
 
 
 @socketio.on('resolve_chat')
+@profiled('resolve_chat')
 def handle_resolve_chat(data):
-    print(f"Resolving chat: {data}")
     chat_id = data['chat_id']
+    log_event(chat_log, 'resolve_chat', chat_id=chat_id)
     
     cur = get_db()
     
     # Get chat details
     cur.execute(
-        "SELECT customer_id, agent_id FROM chats WHERE id = %s",
+        "SELECT customer_id, customer_name, agent_id, messages FROM chats WHERE id = %s",
         (chat_id,)
     )
     result = cur.fetchone()
     
     if not result:
-        print(f"Error: Chat {chat_id} not found")
+        log_event(chat_log, 'chat_not_found', level=logging.WARNING, chat_id=chat_id)
         return
     
     customer_id = result['customer_id']
     agent_id = result['agent_id']
+    # Create our tables before writing: DDL would commit the transaction below halfway
+    ensure_schema()
     
-    # Update chat state
+    # Update chat state; a repeated resolve (double click, retry) changes nothing
     cur.execute(
-        "UPDATE chats SET state = %s, resolved_at = %s WHERE id = %s",
-        (CHAT_STATES['RESOLVED'], datetime.now(), chat_id)
+        "UPDATE chats SET state = %s, resolved_at = %s WHERE id = %s AND state <> %s",
+        (CHAT_STATES['RESOLVED'], datetime.now(), chat_id, CHAT_STATES['RESOLVED'])
     )
+    resolved_now = cur.rowcount > 0
     
-    # Free up agent
-    cur.execute(
-        "UPDATE agents SET current_chat = NULL, status = 'available' WHERE id = %s",
-        (agent_id,)
-    )
+    # Free up the agent's slot
+    agent_pool.release(chat_id)
+    sweeper_timers.cancel(('chat', chat_id))
+    sync_agent_status(cur, agent_id)
+    # The transcript email is queued in the same transaction, so it is sent iff the chat resolved
+    if resolved_now and TRANSCRIPT_EMAILS:
+        enqueue_job(cur, 'transcript_email', {'chat_id': chat_id})
     mysql.connection.commit()
     
     # Notify both parties
     resolution_message = {'message': 'This chat has been marked as resolved'}
+    compact = wire.notice(chat_id, resolution_message['message'])
     
-    # Send to customer
-    socketio.emit(WS_EVENTS['CHAT_RESOLVED'], {
+    # Send to agent
+    emit_chat_event(WS_EVENTS['CHAT_RESOLVED'], request.sid, {
         'chat_id': chat_id,
         **resolution_message
-    }, room=customer_id)
+    }, compact)
+    if not resolved_now:
+        log_event(chat_log, 'chat_already_resolved', level=logging.DEBUG, chat_id=chat_id)
+        return
+    sla_stats.chat_resolved(chat_id)
+    index_transcript('set_state', chat_id, CHAT_STATES['RESOLVED'])
     
-    # Send to agent
-    emit(WS_EVENTS['CHAT_RESOLVED'], {
+    # Send to customer
+    emit_chat_event(WS_EVENTS['CHAT_RESOLVED'], customer_id, {
         'chat_id': chat_id,
         **resolution_message
-    })
+    }, compact)
+
+    # Learn this chat's replies for future suggestions
+    if result['messages']:
+        get_suggestion_index().add_chat(json.loads(result['messages']), result['customer_name'])
+
+    # Backfill the freed slot from the queue
+    route_waiting_chats()
 
 @socketio.on('escalate_request')
+@throttled('escalate_request')
+@profiled('escalate_request')
 def handle_escalate_request(data):
     """Handle escalation requests from the customer side"""
-    print(f"Escalation request: {data}")
+    log_event(chat_log, 'escalate_request', chat_id=data.get('chatId'), user_id=data.get('userId'))
     
     # Data should contain chat_id, userId, userType, caseNumber, priority
     chat_id = data.get('chatId') or str(uuid.uuid4())
@@ -605,14 +1660,10 @@ def handle_escalate_request(data):
     priority = data.get('priority') or 'medium'
     
     # Get user details
-    customer = None
-    for c in customers:
-        if c['user_id'] == user_id:
-            customer = c
-            break
+    customer = get_catalog().customers_by_id.get(user_id)
     
     if not customer:
-        print(f"Error: Customer {user_id} not found")
+        log_event(chat_log, 'customer_not_found', level=logging.WARNING, user_id=user_id)
         return
     
     # Create chat entry if it doesn't exist
@@ -630,6 +1681,8 @@ def handle_escalate_request(data):
              json.dumps([]), data.get('issue', 'Support request'))
         )
         mysql.connection.commit()
+        index_transcript('upsert_chat', chat_id, user_id, customer['name'], case_number,
+                         CHAT_STATES['WAITING'], datetime.now().isoformat())
     
     # Notify all agents about the escalation
     socketio.emit(WS_EVENTS['CHAT_ESCALATED'], {
@@ -638,11 +1691,8 @@ def handle_escalate_request(data):
         'caseNumber': case_number,
         'customerName': customer['name'],
         'customerDetails': {
-            'name': customer['name'],
-            'email': customer['email'],
-            'phone': customer.get('phone', ''),
-            'type': data.get('userType', 'regular'),
-            'memberSince': '2023-01-01'  # Placeholder
+            **customer_details(user_id),
+            **({'type': data['userType']} if data.get('userType') else {})
         },
         'issue': data.get('issue', 'Support request'),
         'messages': [],
@@ -658,33 +1708,53 @@ def handle_escalate_request(data):
         'customer_name': customer['name'],
         'timestamp': datetime.now().isoformat(),
         'issue': data.get('issue', 'Support request'),
-        'priority': priority
+        'priority': priority,
+        'customer_profile': profile_cache.get(user_id)
     })
 
+    # Hand it straight to an agent with spare capacity, if any
+    if not exists:
+        touch_chat(chat_id, CHAT_STATES['WAITING'])
+        sla_stats.chat_waiting(chat_id)
+    route_waiting_chats()
+
 # ... (keep all previous imports and initial setup)
 
+@socketio.on('search_transcripts')
+def handle_search_transcripts(data):
+    """Agents only: same filters as GET /transcripts/search."""
+    if request.sid not in agent_pool.agents:
+        emit('error', {'message': 'Only logged-in agents can search transcripts'})
+        return
+    emit('transcript_search_results', search_transcripts(data or {}))
+
+@socketio.on('supervisor_join')
+def handle_supervisor_join(data=None):
+    """Subscribe to periodic queue_stats broadcasts (logged-in agents or STAFF_API_TOKEN holders)."""
+    token = os.getenv('STAFF_API_TOKEN')
+    if request.sid not in agent_pool.agents and not (token and (data or {}).get('token') == token):
+        emit('error', {'message': 'Only agents and staff can watch queue statistics'})
+        return
+    join_room(SUPERVISORS_ROOM)
+    emit(WS_EVENTS['QUEUE_STATS'], queue_snapshot())
+
+@socketio.on('supervisor_leave')
+def handle_supervisor_leave(data=None):
+    leave_room(SUPERVISORS_ROOM)
+
 @socketio.on('join')
 def on_join(data):
     """Join a chat room"""
     chat_id = data.get('chat_id')
     if chat_id:
         join_room(chat_id)
-        print(f"User {request.sid} joined chat room {chat_id}")
-        # Send chat history when joining
-        cur = get_db()
-        cur.execute(
-            "SELECT messages FROM chats WHERE id = %s",
-            (chat_id,)
-        )
-        chat = cur.fetchone()
-        if chat and chat['messages']:
-            messages = json.loads(chat['messages'])
-            emit('chat_history', {
-                'chat_id': chat_id,
-                'messages': messages
-            })
+        log_event(socket_log, 'join', chat_id=chat_id)
+        # Send chat history when joining (archived chats are read from the archive)
+        messages = read_messages(chat_id)
+        if messages:
+            emit_history(chat_id, messages, messages, data.get('after'))
     else:
-        print("No chat_id provided for join event")
+        log_event(socket_log, 'join_without_chat_id', level=logging.WARNING)
 
 @socketio.on('leave')
 def on_leave(data):
@@ -692,12 +1762,18 @@ def on_leave(data):
     chat_id = data.get('chat_id')
     if chat_id:
         leave_room(chat_id)
-        print(f"User {request.sid} left chat room {chat_id}")
+        log_event(socket_log, 'leave', chat_id=chat_id)
 
 @socketio.on('transfer_chat')
+@profiled('transfer_chat')
 def handle_transfer_chat(data):
     chat_id = data.get('chat_id')
     new_agent_id = data.get('agent_id')
+    # Only logged-in agents (by socket id) can take a chat; anything else would
+    # become a phantom pool entry that holds the chat forever
+    if new_agent_id not in agent_pool.agents:
+        emit('error', {'message': 'Target agent is not online'})
+        return
     
     cur = get_db()
     try:
@@ -719,17 +1795,14 @@ def handle_transfer_chat(data):
             "UPDATE chats SET agent_id = %s WHERE id = %s",
             (new_agent_id, chat_id)
         )
-        # Free up previous agent
-        cur.execute(
-            "UPDATE agents SET current_chat = NULL, status = 'available' WHERE id = %s",
-            (old_agent_id,)
-        )
-        # Assign to new agent
-        cur.execute(
-            "UPDATE agents SET current_chat = %s, status = 'busy' WHERE id = %s",
-            (chat_id, new_agent_id)
-        )
+        # Move the chat between agents' slots (an explicit transfer may exceed capacity)
+        agent_pool.assign(new_agent_id, chat_id)
+        if old_agent_id:
+            sync_agent_status(cur, old_agent_id)
+        sync_agent_status(cur, new_agent_id)
         mysql.connection.commit()
+        sla_stats.chat_transferred(chat_id)
+        log_event(chat_log, 'chat_transferred', chat_id=chat_id, from_agent=old_agent_id, agent_id=new_agent_id)
 
         # Notify previous agent
         emit('chat_transferred', {
@@ -749,12 +1822,8 @@ def handle_transfer_chat(data):
             'id': chat_id,
             'caseNumber': chat_data['case_number'],
             'customerName': chat_data['customer_name'],
-            'customerDetails': {
-                'name': chat_data['customer_name'],
-                'email': chat_data['customer_email'],
-                'type': 'regular',
-                'memberSince': '2023-01-01'
-            },
+            'customerDetails': customer_details(chat_data['customer_id'], chat_data['customer_name'],
+                                                chat_data['customer_email']),
             'issue': chat_data['issue'],
             'messages': [{
                 'id': f"msg_{i}",
@@ -765,7 +1834,9 @@ def handle_transfer_chat(data):
             'timestamp': chat_data['created_at'].isoformat(),
             'priority': 'medium'
         }
-        emit(WS_EVENTS['CHAT_ASSIGNED'], formatted_chat, room=new_agent_id)
+        emit_chat_event(WS_EVENTS['CHAT_ASSIGNED'], new_agent_id, formatted_chat,
+                        wire.chat_assigned(chat_data, len(messages) - 1, formatted_chat['customerDetails'], new_agent_id,
+                                           agent_pool.agents[new_agent_id].name))
 
         # Notify customer
         emit('agent_transferred', {
@@ -773,17 +1844,24 @@ def handle_transfer_chat(data):
             'message': 'You have been transferred to a new agent'
         }, room=customer_id)
 
+        # The previous agent may have room for a waiting chat now
+        route_waiting_chats()
+
     except Exception as e:
         mysql.connection.rollback()
+        log_event(chat_log, 'transfer_failed', level=logging.ERROR, exc_info=e,
+                  chat_id=chat_id, agent_id=new_agent_id)
         emit('error', {'message': str(e)})
 
 @socketio.on('typing')
+@throttled('typing', silent=True)
 def handle_typing(data):
     chat_id = data.get('chat_id')
     is_typing = data.get('is_typing')
     user_type = data.get('user_type')  # 'agent' or 'customer'
     
     if chat_id and user_type:
+        log_event(socket_log, 'typing', level=logging.DEBUG, chat_id=chat_id, user_type=user_type)
         # Broadcast to other participants
         if user_type == 'agent':
             # Notify customer
@@ -801,28 +1879,21 @@ def handle_typing(data):
             }, room=chat_id, skip_sid=request.sid)
 
 @socketio.on('request_chat_history')
+@profiled('request_chat_history')
 def handle_chat_history(data):
     chat_id = data.get('chat_id')
-    cur = get_db()
-    cur.execute(
-        "SELECT messages FROM chats WHERE id = %s",
-        (chat_id,)
-    )
-    result = cur.fetchone()
-    if result and result['messages']:
-        messages = json.loads(result['messages'])
-        emit('chat_history', {
-            'chat_id': chat_id,
-            'messages': [{
-                'id': f"msg_{i}",
-                'content': msg['text'],
-                'sender': 'customer' if msg['from'] == 'customer' else 'agent',
-                'timestamp': msg['timestamp']
-            } for i, msg in enumerate(messages)]
-        })
+    messages = read_messages(chat_id)
+    if messages:
+        emit_history(chat_id, messages, [{
+            'id': f"msg_{i}",
+            'content': msg['text'],
+            'sender': 'customer' if msg['from'] == 'customer' else 'agent',
+            'timestamp': msg['timestamp']
+        } for i, msg in enumerate(messages)], data.get('after'))
 # In your SocketIO event handlers:
 
 @socketio.on('agent_message')
+@profiled('agent_message')
 def handle_agent_message(data):
     chat_id = data['chat_id']
     message = data['message']
@@ -836,7 +1907,7 @@ def handle_agent_message(data):
     result = cur.fetchone()
     
     if not result:
-        print(f"Error: Chat {chat_id} not found")
+        log_event(chat_log, 'chat_not_found', level=logging.WARNING, chat_id=chat_id)
         return
     
     messages = json.loads(result['messages']) if result['messages'] else []
@@ -854,18 +1925,23 @@ def handle_agent_message(data):
         (json.dumps(messages), chat_id)
     )
     mysql.connection.commit()
+    touch_chat(chat_id, CHAT_STATES['ASSIGNED'])
+    index_transcript('add_message', chat_id, 'agent', message, new_message['timestamp'])
     
-    # Broadcast to all in chat room
-    emit(WS_EVENTS['NEW_MESSAGE'], {
+    # Broadcast to all in chat room; the id is the message's position in the transcript
+    seq = len(messages) - 1
+    emit_chat_event(WS_EVENTS['NEW_MESSAGE'], chat_id, {
         'chat_id': chat_id,
         'message': message,
         'sender': 'agent',
-        'id': str(uuid.uuid4()),
+        'id': f"msg_{seq}",
         'content': message,
         'timestamp': new_message['timestamp']
-    }, room=chat_id)  # Changed to chat_id room
+    }, wire.new_message(chat_id, seq, new_message))
 
 @socketio.on('customer_message')
+@throttled('customer_message')
+@profiled('customer_message')
 def handle_customer_message(data):
     chat_id = data['chat_id']
     message = data['message']
@@ -879,7 +1955,7 @@ def handle_customer_message(data):
     result = cur.fetchone()
     
     if not result:
-        print(f"Error: Chat {chat_id} not found")
+        log_event(chat_log, 'chat_not_found', level=logging.WARNING, chat_id=chat_id)
         return
     
     messages = json.loads(result['messages']) if result['messages'] else []
@@ -897,44 +1973,85 @@ def handle_customer_message(data):
         (json.dumps(messages), chat_id)
     )
     mysql.connection.commit()
+    touch_chat(chat_id, CHAT_STATES['ASSIGNED'] if result['agent_id'] else CHAT_STATES['WAITING'])
+    index_transcript('add_message', chat_id, 'customer', message, new_message['timestamp'])
     
-    # Broadcast to all in chat room
-    emit(WS_EVENTS['NEW_MESSAGE'], {
+    # Broadcast to all in chat room; the id is the message's position in the transcript
+    seq = len(messages) - 1
+    emit_chat_event(WS_EVENTS['NEW_MESSAGE'], chat_id, {
         'chat_id': chat_id,
         'message': message,
         'sender': 'customer',
-        'id': str(uuid.uuid4()),
+        'id': f"msg_{seq}",
         'content': message,
         'timestamp': new_message['timestamp']
-    }, room=chat_id)  # Changed to chat_id room
+    }, wire.new_message(chat_id, seq, new_message))
+
+    push_suggestions(result['agent_id'], chat_id, message)
 
 @socketio.on('join_chat')
+@profiled('join_chat')
 def handle_join_chat(data):
     chat_id = data['chat_id']
     user_type = data['user_type']  # 'agent' or 'customer'
     
     join_room(chat_id)
-    print(f"{user_type} joined chat {chat_id}")
+    log_event(socket_log, 'join_chat', chat_id=chat_id, user_type=user_type)
     
     # Send chat history
-    cur = get_db()
-    cur.execute(
-        "SELECT messages FROM chats WHERE id = %s",
-        (chat_id,)
-    )
-    result = cur.fetchone()
-    
-    if result and result['messages']:
-        messages = json.loads(result['messages'])
-        emit('chat_history', {
-            'chat_id': chat_id,
-            'messages': [{
-                'id': f"msg_{i}",
-                'content': msg['text'],
-                'sender': msg['from'],
-                'timestamp': msg['timestamp']
-            } for i, msg in enumerate(messages)]
-        })
+    messages = read_messages(chat_id)
+    if messages:
+        emit_history(chat_id, messages, [{
+            'id': f"msg_{i}",
+            'content': msg['text'],
+            'sender': msg['from'],
+            'timestamp': msg['timestamp']
+        } for i, msg in enumerate(messages)], data.get('after'))
+
+# 🏭 App factory
+def create_app(config=None):
+    setup_logging()
+    app = Flask(__name__)
+    app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST')
+    app.config['MYSQL_USER'] = os.getenv('MYSQL_USER')
+    app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD')
+    app.config['MYSQL_DB'] = os.getenv('MYSQL_DB')
+    app.config['MYSQL_PORT'] = int(os.getenv('MYSQL_PORT', 3306))
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'localhost')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', '1') != '0'
+    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
+    # Set WARMUP=0 to skip background warm-up (e.g. in tests and scripts)
+    app.config['WARMUP'] = os.getenv('WARMUP', '1') != '0'
+    if config:
+        app.config.update(config)
+
+    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+    socketio.init_app(app, cors_allowed_origins="*", async_mode='eventlet')
+    mysql.init_app(app)
+    mail.init_app(app)
+    app.register_blueprint(api)
+
+    if app.config['WARMUP']:
+        socketio.start_background_task(warm_up, app)
+    else:
+        WARMUP['skipped'] = True
+    # Set SWEEPER=0 to disable chat/agent timeouts, ARCHIVER=0 to disable archival
+    # and JOB_WORKERS=0 to run no background job workers in this process
+    if os.getenv('SWEEPER', '1') != '0':
+        socketio.start_background_task(run_sweeper, app)
+    if os.getenv('ARCHIVER', '1') != '0':
+        socketio.start_background_task(run_archiver, app)
+    if QUEUE_STATS_INTERVAL > 0:
+        socketio.start_background_task(run_queue_stats_broadcast)
+    for n in range(JOB_WORKERS):
+        socketio.start_background_task(run_job_worker, app, f"{socket.gethostname()}:{os.getpid()}:{n}")
+    return app
 
+# The app (and its background tasks) is only built by an entry point -- here or wsgi.py --
+# so importing this module has no side effects
 if __name__ == '__main__':
+    app = create_app()
     socketio.run(app, host='0.0.0.0', port=PORT)
\ No newline at end of file
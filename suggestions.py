@@ -0,0 +1,189 @@
+# 💡 Suggested agent replies from resolved-chat history
+#
+# Every agent reply in a resolved chat becomes a document: the text is what
+# the customer said just before it, the payload is the reply itself. New
+# customer messages are scored against those documents with BM25 and the
+# best distinct replies are offered to the agent. Everything is local and
+# incremental: add_chat() on resolve appends to per-term posting lists, and
+# queries touch only the postings of their own terms.
+import re
+
+import numpy as np
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset("""
+a an and are as at be but by can could did do does for from had has have hello hi how i is it
+its me my of on or our please so that the their them there they this to was we were what when
+where which who why will with would you your
+""".split())
+
+# Customer-specific details (IDs, contact details, names) are masked so a
+# suggestion doesn't carry one customer's data to another customer's chat
+REDACTIONS = [
+    (re.compile(r'\bord\d+\b', re.IGNORECASE), '[order id]'),
+    (re.compile(r'\bpay\d+\b', re.IGNORECASE), '[payment id]'),
+    (re.compile(r'\b[\w.+-]+@[\w-]+\.[\w.]+\b'), '[email]'),
+    (re.compile(r'\+?\d[\d\s-]{6,}\d'), '[number]'),
+]
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def name_pattern(names):
+    """
+    Regex matching each part of the given names ('Somto Kenechukwu' -> Somto,
+    Kenechukwu) as written or capitalized; None when there is nothing to match.
+    Matching is case-sensitive so a name like 'Will' leaves "will" alone.
+    """
+    parts = set()
+    for name in names:
+        for part in (name or '').split():
+            if len(part) > 1:
+                parts.update((part, part.capitalize()))
+    if not parts:
+        return None
+    # Longest first so 'Ann' doesn't win over 'Anne'
+    alternatives = '|'.join(re.escape(part) for part in sorted(parts, key=len, reverse=True))
+    return re.compile(rf'\b(?:{alternatives})\b')
+
+
+def redact(text, names=None):
+    """Mask IDs, emails and numbers, plus names matched by `names` (a name_pattern())."""
+    for pattern, placeholder in REDACTIONS:
+        text = pattern.sub(placeholder, text)
+    if names is not None:
+        text = names.sub('[name]', text)
+    return text
+
+
+def reply_pairs(messages):
+    """(customer context, agent reply) pairs from a transcript of {'from', 'text'} dicts."""
+    pairs, context = [], []
+    for msg in messages:
+        sender, text = msg.get('from'), (msg.get('text') or '').strip()
+        if not text:
+            continue
+        if sender == 'customer':
+            context.append(text)
+        elif sender == 'agent' and context:
+            pairs.append((' '.join(context), text))
+            context = []
+    return pairs
+
+
+class _GrowableArray:
+    """Append-only NumPy buffer with amortized O(1) appends; view() is a no-copy slice."""
+    __slots__ = ('data', 'size')
+
+    def __init__(self, dtype, capacity=4):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self.data):
+            grown = np.empty(len(self.data) * 2, dtype=self.data.dtype)
+            grown[:self.size] = self.data
+            self.data = grown
+        self.data[self.size] = value
+        self.size += 1
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class _Postings:
+    __slots__ = ('docs', 'tfs')
+
+    def __init__(self):
+        self.docs = _GrowableArray(np.int32)
+        self.tfs = _GrowableArray(np.float32)
+
+    def add(self, doc_id, tf):
+        self.docs.append(doc_id)
+        self.tfs.append(tf)
+
+    def arrays(self):
+        return self.docs.view(), self.tfs.view()
+
+
+class SuggestionIndex:
+    def __init__(self, k1=1.2, b=0.75, known_names=()):
+        self.k1 = k1
+        self.b = b
+        self.known_names = list(known_names)   # e.g. every catalog customer; redacted in all replies
+        self.postings = {}              # term -> _Postings
+        self.doc_reply = []             # doc id -> reply id
+        self.doc_len = _GrowableArray(np.float32, capacity=1024)
+        self.replies = []               # reply id -> redacted text
+        self.reply_ids = {}             # redacted text -> reply id (dedup)
+        self.total_len = 0
+        self.chats = 0
+
+    def __len__(self):
+        return len(self.doc_reply)
+
+    def add_document(self, context, reply, names=None):
+        terms = tokenize(context)
+        if not terms:
+            return
+        reply = redact(reply, names)
+        reply_id = self.reply_ids.get(reply)
+        if reply_id is None:
+            reply_id = self.reply_ids[reply] = len(self.replies)
+            self.replies.append(reply)
+        doc_id = len(self.doc_reply)
+        self.doc_reply.append(reply_id)
+        self.doc_len.append(len(terms))
+        self.total_len += len(terms)
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+            postings.add(doc_id, tf)
+
+    def add_chat(self, messages, customer_name=None):
+        """Index every agent reply of a resolved chat, with the customer's and known names masked."""
+        names = name_pattern([customer_name, *self.known_names])
+        for context, reply in reply_pairs(messages):
+            self.add_document(context, reply, names)
+        self.chats += 1
+
+    def suggest(self, text, k=3):
+        """Top-k distinct (reply, score) pairs for a customer message."""
+        n = len(self.doc_reply)
+        terms = set(tokenize(text or ''))
+        if not n or not terms:
+            return []
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len.view() / (self.total_len / n))
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            docs, tfs = postings.arrays()
+            idf = np.log1p((n - len(docs) + 0.5) / (len(docs) + 0.5))
+            # doc ids are unique within one posting list, so fancy-index += is safe
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+        # Take a few extra candidates so duplicates of one reply don't crowd the top-k
+        candidates = min(n, k * 8)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = top[np.argsort(-scores[top])]
+        results, seen = [], set()
+        for doc_id in top:
+            score = float(scores[doc_id])
+            if score <= 0:
+                break
+            reply_id = self.doc_reply[doc_id]
+            if reply_id in seen:
+                continue
+            seen.add(reply_id)
+            results.append({'text': self.replies[reply_id], 'score': round(score, 3)})
+            if len(results) == k:
+                break
+        return results
@@ -0,0 +1,63 @@
+import pytest
+
+from catalog import Catalog
+
+
+def order(order_id, userid, paymentid=None, delivered_on=None):
+    return {'order_id': order_id, 'userid': userid, 'product': 'p001', 'quantity': 1, 'status': 'delivered',
+            'delivered_on': delivered_on, 'paid': bool(paymentid), 'paymentid': paymentid}
+
+
+def payment(paymentid, userid, order_id, timestamp):
+    return {'paymentid': paymentid, 'userid': userid, 'order_id': order_id, 'amount': 1000,
+            'status': 'success', 'method': 'paystack', 'timestamp': timestamp}
+
+
+@pytest.fixture
+def catalog():
+    # File order is deliberately not date order
+    orders = [
+        order('ord130', 'u1', 'pay010', '2025-05-02'),
+        order('ord125', 'u1', 'pay003', '2025-04-21'),
+        order('ord127', 'u1', 'pay005', '2025-04-25'),
+        order('ord200', 'u2', 'pay020', '2025-06-01'),
+    ]
+    payments = [
+        payment('pay010', 'u1', 'ord130', '2025-04-30T10:00:00Z'),
+        payment('pay003', 'u1', 'ord125', '2025-04-19T09:17:00Z'),
+        payment('pay005', 'u1', 'ord127', '2025-05-20T08:00:00Z'),
+        payment('pay020', 'u2', 'ord200', '2025-05-30T12:00:00Z'),
+    ]
+    return Catalog(customers=[], products=[], orders=orders, payments=payments, policy={'refund_window_days': 5})
+
+
+@pytest.mark.parametrize('message, order_id', [
+    ('what happened to ORD125?', 'ord125'),
+    ('I was charged on pay003', 'ord125'),
+    ('ord127 and ord125', 'ord127'),
+])
+def test_explicit_id_wins(catalog, message, order_id):
+    order, explicit = catalog.resolve_order(message, 'u1')
+    assert (order['order_id'], explicit) == (order_id, True)
+
+
+def test_ids_of_other_customers_are_ignored(catalog):
+    order, explicit = catalog.resolve_order('where is ord200? paid with pay020', 'u1')
+    assert (order['order_id'], explicit) == ('ord127', False)
+
+
+def test_fallback_is_newest_order_by_date_not_file_order(catalog):
+    order, explicit = catalog.resolve_order('where is my order', 'u1')
+    assert (order['order_id'], explicit) == ('ord127', False)
+    assert [o['order_id'] for o in catalog.orders_by_user['u1']] == ['ord125', 'ord130', 'ord127']
+
+
+def test_recency_falls_back_to_delivery_date_without_payment():
+    catalog = Catalog(customers=[], products=[], payments=[], policy={},
+                      orders=[order('ord2', 'u1', delivered_on='2025-03-01'),
+                              order('ord1', 'u1', delivered_on='2025-02-01')])
+    assert catalog.resolve_order('hi', 'u1')[0]['order_id'] == 'ord2'
+
+
+def test_customer_without_orders(catalog):
+    assert catalog.resolve_order('where is ord125', 'u9') == (None, False)
@@ -0,0 +1,74 @@
+from conversation import ConversationMemory, estimate_tokens
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_turns_within_budget_are_kept_verbatim():
+    memory = ConversationMemory(token_budget=100, clock=FakeClock())
+    memory.add_turn('s', 'customer', 'where is my order')
+    memory.add_turn('s', 'assistant', 'it ships tomorrow')
+    assert memory.render('s') == 'Customer: where is my order\nAssistant: it ships tomorrow'
+    assert memory.render('other') == ''
+
+
+def test_compaction_folds_oldest_turns_into_summary():
+    memory = ConversationMemory(token_budget=30, summary_tokens=200, clock=FakeClock())
+    for i in range(6):
+        session = memory.add_turn('s', 'customer', f'message number {i} ' + 'x' * 20)
+    assert len(session.turns) < 6
+    assert 'customer said: message number' in session.summary
+    assert session.turns[-1][1].startswith('message number 5')
+    assert memory.render('s').startswith('Earlier in this conversation: ')
+
+
+def test_small_budget_bounds_summary_and_session():
+    memory = ConversationMemory(token_budget=50, summary_tokens=200, clock=FakeClock())
+    for i in range(40):
+        session = memory.add_turn('s', 'customer', f'turn {i}: ' + 'y' * 30)
+    assert estimate_tokens(session.summary) <= 50 // 2 + 1
+    assert session.tokens <= 50
+    assert session.tokens == estimate_tokens(session.summary) + sum(estimate_tokens(t) for _, t in session.turns)
+
+
+def test_latest_turn_is_kept_even_over_budget():
+    memory = ConversationMemory(token_budget=10, clock=FakeClock())
+    memory.add_turn('s', 'customer', 'short')
+    session = memory.add_turn('s', 'customer', 'z' * 200)
+    assert list(session.turns) == [('customer', 'z' * 200)]
+
+
+def test_idle_sessions_expire():
+    clock = FakeClock()
+    memory = ConversationMemory(idle_ttl=60, clock=clock)
+    memory.add_turn('old', 'customer', 'hello')
+    clock.now = 30
+    memory.add_turn('new', 'customer', 'hi')
+    clock.now = 70
+    assert memory.get('old', create=False) is None
+    assert memory.get('new', create=False) is not None
+    assert memory.stats() == {'sessions': 1, 'chars': 2, 'evicted': 1}
+
+
+def test_max_chars_evicts_least_recently_used():
+    memory = ConversationMemory(max_chars=25, clock=FakeClock())
+    memory.add_turn('a', 'customer', 'a' * 10)
+    memory.add_turn('b', 'customer', 'b' * 10)
+    memory.get('a')
+    memory.add_turn('c', 'customer', 'c' * 10)
+    assert list(memory.sessions) == ['a', 'c']
+    assert memory.stats()['chars'] == 20
+    assert memory.stats()['evicted'] == 1
+
+
+def test_drop_releases_chars():
+    memory = ConversationMemory(clock=FakeClock())
+    memory.add_turn('s', 'customer', 'hello')
+    memory.drop('s')
+    memory.drop('s')
+    assert memory.stats() == {'sessions': 0, 'chars': 0, 'evicted': 0}
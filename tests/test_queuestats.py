@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from queuestats import P2Quantile, QueueStats
+
+
+@pytest.mark.parametrize('p', [0.5, 0.95])
+def test_p2_quantile_tracks_uniform_distribution(p):
+    rng = random.Random(7)
+    sketch = P2Quantile(p)
+    for _ in range(20000):
+        sketch.add(rng.uniform(0, 100))
+    assert sketch.value() == pytest.approx(p * 100, abs=2)
+
+
+def test_p2_quantile_with_few_samples():
+    sketch = P2Quantile(0.5)
+    assert sketch.value() is None
+    for x in (5, 1, 3):
+        sketch.add(x)
+    assert sketch.value() == 3
+
+
+def test_queue_stats_wait_and_abandon():
+    now = [0.0]
+    stats = QueueStats(clock=lambda: now[0])
+    stats.chat_waiting('a')
+    stats.chat_waiting('b')
+    now[0] = 30.0
+    stats.chat_assigned('a')
+    stats.chat_resolved('b', auto=True)
+    snapshot = stats.snapshot()
+    assert snapshot['waiting'] == 0
+    assert snapshot['wait']['count'] == 1
+    assert snapshot['wait']['max_seconds'] == 30.0
+    assert snapshot['totals']['abandoned'] == 1
+    # An expired waiting chat was never served, so it isn't a resolution
+    assert snapshot['totals']['auto_resolved'] == 0
+    assert snapshot['resolved_last_hour'] == 0
+    stats.chat_resolved('a')
+    assert stats.snapshot()['resolved_last_hour'] == 1
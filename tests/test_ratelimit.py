@@ -0,0 +1,60 @@
+import pytest
+
+from ratelimit import MemoryBackend, RateLimiter, parse_rules
+
+
+def test_bucket_allows_burst_then_refills():
+    now = [0.0]
+    backend = MemoryBackend(clock=lambda: now[0])
+    assert all(backend.take('k', 1.0, 3)[0] for _ in range(3))
+    allowed, retry_after = backend.take('k', 1.0, 3)
+    assert not allowed
+    assert retry_after == pytest.approx(1.0)
+    now[0] = 1.0
+    assert backend.take('k', 1.0, 3)[0]
+
+
+def test_keys_have_separate_buckets_and_are_capped():
+    backend = MemoryBackend(max_keys=2, clock=lambda: 0.0)
+    for key in ('a', 'b', 'c'):
+        assert backend.take(key, 1.0, 1)[0]
+    assert list(backend.buckets) == ['b', 'c']
+
+
+def test_parse_rules_layers_over_defaults():
+    rules = parse_rules('support=1/2, bogus ,typing=x')
+    assert rules['support'] == (1.0, 2.0)
+    assert rules['customer_message'] == (1.0, 10)
+
+
+def test_customers_behind_one_ip_get_their_own_budget():
+    limiter = RateLimiter(MemoryBackend(clock=lambda: 0.0), parse_rules(None))
+    results = [limiter.check('support', ip='10.0.0.1', identifier=f'user{i}')[0] for i in range(8)]
+    assert all(results)
+
+
+def test_ip_rule_can_be_overridden():
+    limiter = RateLimiter(MemoryBackend(clock=lambda: 0.0), parse_rules('support:ip=1/2'))
+    assert limiter.check('support', ip='10.0.0.1', identifier='a')[0]
+    assert limiter.check('support', ip='10.0.0.1', identifier='b')[0]
+    allowed, _, key = limiter.check('support', ip='10.0.0.1', identifier='c')
+    assert not allowed and key == 'ip'
+    assert limiter.stats()['support'] == {'allowed': 2, 'rejected': 1}
+    assert 'support:ip' not in limiter.stats()
+
+
+def test_rejected_request_takes_no_tokens():
+    backend = MemoryBackend(clock=lambda: 0.0)
+    limiter = RateLimiter(backend, {'r': (1.0, 3), 'r:ip': (1.0, 1)})
+    assert limiter.check('r', sid='s1', ip='10.0.0.1')[0]
+    for _ in range(5):
+        assert limiter.check('r', sid='s1', ip='10.0.0.1')[2] == 'ip'
+    # Only the one allowed request spent a token from the sid's bucket
+    assert backend.buckets['r:sid:s1'][0] == 2
+    assert limiter.check('r', sid='s1', ip='10.0.0.2')[0]
+
+
+def test_check_without_keys_or_rule_allows():
+    limiter = RateLimiter(MemoryBackend(), parse_rules(None))
+    assert limiter.check('support', ip=None, identifier='')[0]
+    assert limiter.check('unknown', ip='10.0.0.1') == (True, 0.0, None)
@@ -0,0 +1,68 @@
+import pytest
+
+from routing import AgentPool
+
+
+@pytest.fixture
+def pool():
+    return AgentPool(default_capacity=3, max_capacity=10)
+
+
+@pytest.mark.parametrize('capacity, expected', [
+    ('4', 4),
+    ('x', None),
+    (None, None),
+    (10 ** 6, 10),
+    (0, 1),
+])
+def test_clamp_capacity(pool, capacity, expected):
+    assert pool.clamp_capacity(capacity) == expected
+
+
+def test_register_falls_back_to_default_capacity(pool):
+    assert pool.register('a', 'Ada', capacity='x').capacity == 3
+    assert pool.register('b', 'Bo', capacity='4').capacity == 4
+
+
+def test_pick_agent_prefers_lower_load_ratio(pool):
+    pool.register('small', capacity=2)
+    pool.register('big', capacity=10)
+    for agent_id in ('small', 'big'):
+        pool.set_available(agent_id)
+    pool.assign('small', 'c1')
+    pool.assign('big', 'c2')
+    pool.assign('big', 'c3')
+    # 1/2 busy vs 2/10 busy
+    assert pool.pick_agent().agent_id == 'big'
+
+
+def test_pick_agent_skips_full_and_unavailable_agents(pool):
+    pool.register('full', capacity=1)
+    pool.register('away', capacity=5)
+    pool.set_available('full')
+    pool.assign('full', 'c1')
+    assert pool.pick_agent() is None
+    pool.set_available('away')
+    assert pool.pick_agent().agent_id == 'away'
+
+
+def test_assign_moves_chat_on_transfer(pool):
+    pool.register('a')
+    pool.register('b')
+    pool.assign('a', 'c1')
+    pool.assign('b', 'c1')
+    assert pool.agent_of('c1') == 'b'
+    assert pool.agents['a'].load == 0
+    assert list(pool.agents['b'].chats) == ['c1']
+
+
+def test_release_and_unregister_empty_chat_agent(pool):
+    pool.register('a')
+    pool.assign('a', 'c1')
+    pool.assign('a', 'c2')
+    assert pool.release('c1') == 'a'
+    assert pool.release('c1') is None
+    assert pool.chat_agent == {'c2': 'a'}
+    assert pool.unregister('a') == ['c2']
+    assert pool.chat_agent == {}
+    assert pool.unregister('a') == []
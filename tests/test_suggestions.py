@@ -0,0 +1,42 @@
+from suggestions import SuggestionIndex, name_pattern, redact, reply_pairs
+
+REFUND = [
+    {'from': 'customer', 'text': 'I want a refund for my order ord123'},
+    {'from': 'agent', 'text': 'Sure Somto, refund for ord123 done, call +234 801 234 5678'},
+]
+
+
+def test_reply_pairs_join_customer_context():
+    messages = [{'from': 'customer', 'text': 'hi'}, {'from': 'customer', 'text': 'my order?'},
+                {'from': 'agent', 'text': 'Checking'}, {'from': 'agent', 'text': 'Found it'}]
+    assert reply_pairs(messages) == [('hi my order?', 'Checking')]
+
+
+def test_redact_masks_ids_contacts_and_names():
+    names = name_pattern(['Somto Kenechukwu'])
+    assert redact('Sure Somto, mail somto@example.com about pay004', names) == \
+        'Sure [name], mail [email] about [payment id]'
+    assert name_pattern(['', None]) is None
+
+
+def test_names_match_case_sensitively():
+    names = name_pattern(['Will Smith'])
+    assert redact('Will, I will check', names) == '[name], I will check'
+
+
+def test_add_chat_redacts_customer_and_known_names():
+    index = SuggestionIndex(known_names=['Chijioke Uzodinma'])
+    index.add_chat(REFUND, customer_name='Somto Kenechukwu')
+    index.add_chat([{'from': 'customer', 'text': 'refund status please'},
+                    {'from': 'agent', 'text': 'Hi Chijioke, your refund is on its way'}])
+    replies = [s['text'] for s in index.suggest('refund for my order', k=3)]
+    assert 'Sure [name], refund for [order id] done, call [number]' in replies
+    assert 'Hi [name], your refund is on its way' in replies
+    assert index.chats == 2
+
+
+def test_suggest_without_matches():
+    index = SuggestionIndex()
+    assert index.suggest('anything') == []
+    index.add_chat(REFUND)
+    assert index.suggest('weather today') == []
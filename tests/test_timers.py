@@ -0,0 +1,95 @@
+import pytest
+
+from timers import AUTO_RESOLVE, EXPIRE, REQUEUE, TimerWheel, chat_timeout_action
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def wheel():
+    return TimerWheel(tick=1.0, slots=8, clock=FakeClock())
+
+
+def test_timer_fires_once_its_deadline_passes(wheel):
+    wheel.schedule(('chat', 'c1'), 3, payload='p')
+    assert wheel.advance(1002) == []
+    assert wheel.advance(1003) == [(('chat', 'c1'), 'p')]
+    assert wheel.advance(1010) == []
+    assert len(wheel) == 0
+
+
+def test_delay_rounds_up_to_at_least_one_tick(wheel):
+    wheel.schedule('k', 0)
+    assert wheel.advance(1000) == []
+    assert wheel.advance(1001) == [('k', None)]
+
+
+def test_cancel_removes_timer(wheel):
+    wheel.schedule('k', 2)
+    wheel.cancel('k')
+    wheel.cancel('k')
+    assert 'k' not in wheel
+    assert wheel.advance(1005) == []
+
+
+def test_reschedule_replaces_previous_deadline(wheel):
+    wheel.schedule('k', 2)
+    wheel.advance(1001)
+    wheel.schedule('k', 5)
+    assert len(wheel) == 1
+    assert wheel.advance(1005) == []
+    assert wheel.advance(1006) == [('k', None)]
+
+
+def test_len_and_contains(wheel):
+    wheel.schedule('a', 1)
+    wheel.schedule('b', 4)
+    assert len(wheel) == 2
+    assert 'a' in wheel and 'b' in wheel
+    wheel.advance(1001)
+    assert len(wheel) == 1
+    assert 'a' not in wheel and 'b' in wheel
+
+
+def test_timer_further_out_than_one_turn_waits_for_its_deadline(wheel):
+    # 8 slots of 1s: a 20s timer shares a bucket with deadlines 4 and 12 ticks out
+    wheel.schedule('far', 20)
+    for now in range(1001, 1020):
+        assert wheel.advance(now) == []
+    assert wheel.advance(1020) == [('far', None)]
+
+
+def test_advance_after_long_stall_fires_everything_due(wheel):
+    for i in range(1, 6):
+        wheel.schedule(i, i)
+    wheel.schedule('later', 100)
+    fired = sorted(key for key, _ in wheel.advance(1050))
+    assert fired == [1, 2, 3, 4, 5]
+    assert 'later' in wheel
+
+
+def test_advance_uses_clock_by_default():
+    clock = FakeClock()
+    wheel = TimerWheel(tick=1.0, slots=8, clock=clock)
+    wheel.schedule('k', 2)
+    clock.now = 1002
+    assert wheel.advance() == [('k', None)]
+
+
+@pytest.mark.parametrize('state, agent_connected, action', [
+    ('waiting', False, EXPIRE),
+    ('waiting', True, EXPIRE),
+    ('assigned', False, REQUEUE),
+    ('assigned', True, AUTO_RESOLVE),
+    ('resolved', False, None),
+    ('resolved', True, None),
+    (None, False, None),
+])
+def test_chat_timeout_action(state, agent_connected, action):
+    assert chat_timeout_action(state, agent_connected) == action
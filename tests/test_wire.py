@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import wire
+
+
+def test_requested_protocol():
+    assert wire.requested_protocol({'protocol': 2}) == wire.COMPACT
+    assert wire.requested_protocol(None, {'protocol': '2'}) == wire.COMPACT
+    assert wire.requested_protocol({'protocol': 'x'}) == wire.LEGACY
+    assert wire.requested_protocol() == wire.LEGACY
+
+
+def test_parse_after():
+    assert [wire.parse_after(v) for v in ('3', 3, None, 'x', [1])] == [3, 3, -1, -1, -1]
+
+
+def test_history_after_and_round_trip():
+    messages = [{'from': 'customer', 'text': 'hi', 'timestamp': '2026-03-01T10:00:00+00:00'},
+                {'from': 'agent', 'text': 'hello', 'timestamp': '2026-03-01T10:00:01+00:00'},
+                {'from': 'robot', 'text': '?', 'timestamp': None}]
+    payload = wire.unpack(wire.pack(wire.history('c1', messages, after=0)))
+    assert payload == {'c': 'c1', 'm': [[1, 1, 1772359201000, 'hello'], [2, 'robot', None, '?']]}
+
+
+def test_chat_assigned_sends_last_seq_not_transcript():
+    chat = {'id': 'c1', 'case_number': 'CS-1', 'customer_name': 'Ada', 'issue': None,
+            'created_at': datetime.fromisoformat('2026-03-01T10:00:00+00:00')}
+    payload = wire.chat_assigned(chat, 4, {}, 'sid', 'Tolu')
+    assert payload['l'] == 4
+    assert payload['i'] == 'Support request'
+    assert 'm' not in payload
@@ -0,0 +1,69 @@
+# ⏱️ Hashed timer wheel
+#
+# Timers are keyed (e.g. ('chat', chat_id)) so re-arming one on every
+# message is a dict delete + insert: O(1) schedule, O(1) cancel. The wheel
+# has `slots` buckets of `tick` seconds; timers further out than one turn
+# simply stay in their bucket until their deadline tick comes round.
+#
+# chat_timeout_action() is the sweeper's decision for a chat whose timer
+# fired, kept free of DB/socket calls so it can be tested on its own.
+import math
+import time
+
+
+class TimerWheel:
+    def __init__(self, tick=1.0, slots=512, clock=time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self.buckets = [{} for _ in range(slots)]
+        self.bucket_of = {}       # key -> bucket index
+        self.current_tick = int(clock() / tick)
+
+    def __len__(self):
+        return len(self.bucket_of)
+
+    def __contains__(self, key):
+        return key in self.bucket_of
+
+    def schedule(self, key, delay, payload=None):
+        """(Re)arm the timer for key to fire after `delay` seconds."""
+        self.cancel(key)
+        deadline = self.current_tick + max(1, math.ceil(delay / self.tick))
+        index = deadline % len(self.buckets)
+        self.buckets[index][key] = (deadline, payload)
+        self.bucket_of[key] = index
+
+    def cancel(self, key):
+        index = self.bucket_of.pop(key, None)
+        if index is not None:
+            del self.buckets[index][key]
+
+    def advance(self, now=None):
+        """Move the wheel up to `now`; returns [(key, payload)] for every timer that fired."""
+        target = int((self.clock() if now is None else now) / self.tick)
+        expired = []
+        # After a long stall one pass over every bucket is enough
+        steps = min(target - self.current_tick, len(self.buckets))
+        for step in range(1, steps + 1):
+            bucket = self.buckets[(self.current_tick + step) % len(self.buckets)]
+            for key, (deadline, payload) in list(bucket.items()):
+                if deadline <= target:
+                    del bucket[key]
+                    del self.bucket_of[key]
+                    expired.append((key, payload))
+        self.current_tick = max(self.current_tick, target)
+        return expired
+
+
+EXPIRE = 'expire'               # nobody picked the chat up in time
+REQUEUE = 'requeue'             # its agent is gone: back to the waiting queue
+AUTO_RESOLVE = 'auto_resolve'   # agent still connected but the chat went quiet
+
+
+def chat_timeout_action(state, agent_connected):
+    """What to do with a chat (state as stored in chats.state) whose timer fired; None means nothing."""
+    if state == 'waiting':
+        return EXPIRE
+    if state == 'assigned':
+        return AUTO_RESOLVE if agent_connected else REQUEUE
+    return None
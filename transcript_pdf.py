@@ -0,0 +1,44 @@
+# 🧾 PDF transcripts for resolved chats
+#
+# Rendering is CPU-bound (reportlab lays out every paragraph), so callers
+# run it off the event loop -- see the 'transcript_email' job in server.py.
+# reportlab is imported lazily to keep it out of server start-up.
+import html
+import io
+
+SENDER_LABELS = {'customer': 'You', 'agent': 'Support agent', 'bot': 'Assistant', 'system': 'System'}
+
+
+def render_transcript_pdf(chat, messages):
+    """PDF bytes for a chat row (case_number, customer_name, created_at, resolved_at) and its messages."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    styles = getSampleStyleSheet()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title=f"Chat transcript {chat.get('case_number') or ''}",
+                            leftMargin=18 * mm, rightMargin=18 * mm, topMargin=18 * mm, bottomMargin=18 * mm)
+
+    story = [
+        Paragraph(f"Chat transcript &mdash; case {html.escape(str(chat.get('case_number') or 'n/a'))}",
+                  styles['Title']),
+        Paragraph(f"Customer: {html.escape(chat.get('customer_name') or '')}", styles['Normal']),
+        Paragraph(f"Opened: {chat.get('created_at') or ''} &nbsp; Resolved: {chat.get('resolved_at') or ''}",
+                  styles['Normal']),
+        Spacer(1, 6 * mm),
+    ]
+    for msg in messages:
+        text = (msg.get('text') or '').strip()
+        if not text:
+            continue
+        sender = SENDER_LABELS.get(msg.get('from'), html.escape(str(msg.get('from') or '')))
+        stamp = html.escape(str(msg.get('timestamp') or '')[:19].replace('T', ' '))
+        # Paragraph parses a mini-markup, so message text must be escaped
+        body = html.escape(text).replace('\n', '<br/>')
+        story.append(Paragraph(f"<b>{sender}</b> <font size=8 color='#777777'>{stamp}</font><br/>{body}",
+                               styles['BodyText']))
+        story.append(Spacer(1, 3 * mm))
+    doc.build(story)
+    return buffer.getvalue()
@@ -0,0 +1,143 @@
+# 🔎 Full-text search over chat transcripts
+#
+# A local SQLite FTS5 index kept alongside the MySQL chats table. Messages
+# are indexed as they arrive; chat metadata (customer, case number, state)
+# sits in a plain table joined in at query time so filters stay cheap.
+# Results are ranked with bm25 and come back with highlighted snippets.
+import html
+import re
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_meta (
+    chat_id       TEXT PRIMARY KEY,
+    customer_id   TEXT,
+    customer_name TEXT,
+    case_number   TEXT,
+    state         TEXT,
+    created_at    TEXT
+);
+CREATE INDEX IF NOT EXISTS chat_meta_customer ON chat_meta (customer_id);
+CREATE INDEX IF NOT EXISTS chat_meta_case ON chat_meta (case_number);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5 (
+    text,
+    chat_id UNINDEXED,
+    sender UNINDEXED,
+    ts UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Snippets are highlighted with control characters, then HTML-escaped and
+# turned into <mark> tags so message text can't inject markup
+MARK_OPEN, MARK_CLOSE = '\x02', '\x03'
+
+
+def to_match_query(text):
+    """Turn free text into a safe FTS5 query: every word must match, last one as a prefix."""
+    terms = TERM_RE.findall(text)
+    if not terms:
+        return None
+    quoted = ['"' + t.replace('"', '""') + '"' for t in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+class TranscriptIndex:
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                    conn.row_factory = sqlite3.Row
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute('PRAGMA synchronous=NORMAL')
+                    conn.executescript(SCHEMA)
+                    self._conn = conn
+        return self._conn
+
+    def is_empty(self):
+        return self.conn.execute('SELECT 1 FROM chat_meta LIMIT 1').fetchone() is None
+
+    def upsert_chat(self, chat_id, customer_id=None, customer_name=None, case_number=None,
+                    state=None, created_at=None):
+        self.conn.execute(
+            "INSERT INTO chat_meta (chat_id, customer_id, customer_name, case_number, state, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (chat_id) DO UPDATE SET "
+            "customer_id = COALESCE(excluded.customer_id, customer_id), "
+            "customer_name = COALESCE(excluded.customer_name, customer_name), "
+            "case_number = COALESCE(excluded.case_number, case_number), "
+            "state = COALESCE(excluded.state, state), "
+            "created_at = COALESCE(excluded.created_at, created_at)",
+            (chat_id, customer_id, customer_name, case_number, state, created_at)
+        )
+
+    def set_state(self, chat_id, state):
+        self.conn.execute("UPDATE chat_meta SET state = ? WHERE chat_id = ?", (state, chat_id))
+
+    def add_message(self, chat_id, sender, text, ts):
+        self.conn.execute(
+            "INSERT INTO messages (text, chat_id, sender, ts) VALUES (?, ?, ?, ?)",
+            (text, chat_id, sender, ts)
+        )
+
+    def add_chat(self, chat_id, customer_id, customer_name, case_number, state, created_at, messages):
+        """Index a whole chat at once (backfill); messages are {'from', 'text', 'timestamp'} dicts."""
+        conn = self.conn
+        conn.execute('BEGIN')
+        try:
+            self.upsert_chat(chat_id, customer_id, customer_name, case_number, state, created_at)
+            conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            conn.executemany(
+                "INSERT INTO messages (text, chat_id, sender, ts) VALUES (?, ?, ?, ?)",
+                [(m['text'], chat_id, m['from'], m['timestamp']) for m in messages
+                 if m.get('text') and m.get('from') != 'system']
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def search(self, text, customer_id=None, case_number=None, state=None, since=None, until=None,
+               limit=20, offset=0):
+        """Ranked matches: one row per message with chat metadata and a highlighted snippet."""
+        query = to_match_query(text or '')
+        if query is None:
+            return []
+        sql = [
+            "SELECT m.chat_id, m.sender, m.ts, c.customer_id, c.customer_name, c.case_number, c.state, "
+            "snippet(messages, 0, char(2), char(3), '…', 12) AS snippet, bm25(messages) AS score "
+            "FROM messages m JOIN chat_meta c ON c.chat_id = m.chat_id "
+            "WHERE messages MATCH ?"
+        ]
+        params = [query]
+        for column, value in (('c.customer_id', customer_id), ('c.case_number', case_number),
+                              ('c.state', state)):
+            if value:
+                sql.append(f"AND {column} = ?")
+                params.append(value)
+        if since:
+            sql.append("AND m.ts >= ?")
+            params.append(since)
+        if until:
+            sql.append("AND m.ts < ?")
+            params.append(until)
+        sql.append("ORDER BY score LIMIT ? OFFSET ?")
+        params += [limit, offset]
+        results = []
+        for row in self.conn.execute(' '.join(sql), params):
+            result = dict(row)
+            result['snippet'] = (html.escape(result['snippet'])
+                                 .replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>'))
+            results.append(result)
+        return results
@@ -0,0 +1,95 @@
+# 📦 Compact wire protocol for chat events
+#
+# Protocol 1 (legacy) is the original JSON shape. Clients opt in to protocol
+# 2 when connecting (Socket.IO auth {'protocol': 2} or ?protocol=2); they then
+# receive COMPACT_EVENTS as binary MessagePack payloads with:
+#   - one short key per field (no message/content or chat_id/id duplicates)
+#   - integer epoch-millisecond timestamps instead of ISO strings
+#   - the message's position in the chat transcript as its id ('s', seq):
+#     monotonic per chat, so clients can dedupe and ask for `after=<seq>`
+#   - chat_assigned carries only the transcript's last seq ('l'); the client
+#     fetches whatever it doesn't have yet with chat_history `after=`
+#   - senders as small ints (SENDERS)
+# Messages in lists are rows: [seq, sender, ts_ms, text].
+# Every other event keeps its JSON shape for both protocols.
+from datetime import datetime
+
+import msgpack
+
+LEGACY = 1
+COMPACT = 2
+
+COMPACT_EVENTS = ('new_message', 'chat_assigned', 'chat_history', 'chat_resolved')
+
+# Unknown senders pass through as strings
+SENDERS = {'customer': 0, 'agent': 1, 'system': 2, 'bot': 3}
+
+
+def requested_protocol(auth=None, args=None):
+    """Protocol version asked for at connect time; anything unrecognised means legacy."""
+    value = (auth or {}).get('protocol') if isinstance(auth, dict) else None
+    if value is None and args is not None:
+        value = args.get('protocol')
+    try:
+        return COMPACT if int(value) == COMPACT else LEGACY
+    except (TypeError, ValueError):
+        return LEGACY
+
+
+def epoch_ms(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1000)
+
+
+def message_row(seq, msg):
+    return [seq, SENDERS.get(msg['from'], msg['from']), epoch_ms(msg.get('timestamp')), msg['text']]
+
+
+def new_message(chat_id, seq, msg):
+    return {'c': chat_id, 's': seq, 'f': SENDERS.get(msg['from'], msg['from']),
+            't': epoch_ms(msg.get('timestamp')), 'x': msg['text']}
+
+
+def parse_after(value):
+    """Client-supplied `after` seq as an int; -1 (everything) if missing or malformed."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def history(chat_id, messages, after=-1):
+    """Transcript rows with seq > after (the whole transcript by default)."""
+    return {'c': chat_id, 'm': [message_row(seq, msg) for seq, msg in enumerate(messages) if seq > after]}
+
+
+def chat_assigned(chat, last_seq, customer_details, agent_id, agent_name, priority='medium'):
+    """Agent-side assignment: the chat card and the seq of its latest message (-1 if none)."""
+    return {
+        'c': chat['id'],
+        'n': chat['case_number'],
+        'u': chat['customer_name'],
+        'd': customer_details,
+        'i': chat.get('issue') or 'Support request',
+        't': epoch_ms(chat['created_at']),
+        'p': priority,
+        'a': agent_id,
+        'an': agent_name,
+        'l': last_seq,
+    }
+
+
+def notice(chat_id, text, **fields):
+    """Small chat notifications (customer-side chat_assigned, chat_resolved)."""
+    return {'c': chat_id, 'x': text, **fields}
+
+
+def pack(payload):
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False)
@@ -0,0 +1,5 @@
+# WSGI entry point, e.g. `gunicorn -k eventlet -w 1 wsgi:app`.
+# `python server.py` builds the app the same way; importing server alone starts nothing.
+from server import create_app
+
+app = create_app()